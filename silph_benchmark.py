@@ -0,0 +1,450 @@
+# Benchmarks for the hot paths of the scraper, run over recorded HTML fixtures and synthetic results
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tempfile
+from urllib.parse import unquote
+import numpy as np
+from bs4 import BeautifulSoup, FeatureNotFound
+
+import silph_factions_scraper as sf
+from silph_mock_server import MockSilphServer, fixture_cache, fixture_path, recorded_usernames
+
+# Global variables for the default benchmark settings.
+benchmark_sizes = [10_000, 100_000, 1_000_000]
+benchmark_workers = [1, 8]
+regression_threshold = 0.2 # Slowdowns larger than this fraction of the baseline are reported as regressions
+synthetic_marker = "synthetic.txt" # Written into the fixture directory by write_synthetic_fixtures()
+
+# Pokemon titles as they appear on Silph Cards, covering each branch of pokemon_name_clean().
+synthetic_mons = ["Armored Mewtwo", "Alolan Ninetales", "Galarian Stunfisk", "Hisuian Avalugg", "Giratina (Origin Forme)",
+                  "Wormadam (Trash Cloak)", "Pumpkaboo (Super Size)", "Castform (Snowy Form)", "Castform (Normal Form)",
+                  "Medicham", "Registeel", "Azumarill", "Skarmory", "Swampert", "Altaria", "Umbreon"]
+tier_page_pattern = re.compile("(factions/cycle/season-\\d+-cycle-\\d+-)([^-/]+)-([^-/]+)")
+
+def write_synthetic_fixtures(fixture_dir = fixture_cache, tiers = ("Gold", "Silver"), regions = ("NA", "EMEA"),
+                             factions_per_page = 4, members_per_faction = 5, bouts_per_card = 8, seed = 0):
+    """
+    Function to write a synthetic corpus of tier and region pages, faction pages and Silph Cards in the markup of
+    the Silph website, so the benchmarks can be reproduced without recording live pages. The markup only has the
+    elements the parsers read and about as many tournaments per card as bouts_per_card, so parse times per card
+    are lower than on recorded cards, which remain the default benchmark input. Cards include non-factions
+    tournaments and promotion/relegation bouts so every branch of the parsing functions is exercised.
+    Arguments:
+    - fixture_dir:
+        path string for the fixture directory. Default is "__fixtures__"
+    - tiers, regions:
+        iterables of strs of the tiers and regions to write pages for.
+    - factions_per_page, members_per_faction, bouts_per_card:
+        ints for the size of the corpus.
+    - seed:
+        int seeding the generated teams and records, so the corpus is identical across runs.
+    Returns:
+        str of the url_base path of the tier and region pages, e.g. "/factions/cycle/season-2-cycle-4-"
+    """
+    sf._setup_cache(fixture_dir)
+    with open(os.path.join(fixture_dir, synthetic_marker), "w") as f:
+        f.write("Synthetic pages written by silph_benchmark.write_synthetic_fixtures(), not recordings of silph.gg.\n")
+    generator = random.Random(seed)
+    url_base = "/factions/cycle/season-2-cycle-4-"
+
+    def write(url_path, content):
+        with open(fixture_path(fixture_dir, url_path), "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def team():
+        return [{"title": generator.choice(synthetic_mons), "shadow": generator.random() < 0.1} for _ in range(6)]
+
+    def mons_html(pokemon):
+        return "".join(f'<div class="pokemon" title="{mon["title"]}">' + ('<img class="shadow"/>' if mon["shadow"] else "") + "</div>"
+                       for mon in pokemon)
+
+    def arena_tournament(number, faction):
+        return (f'<div class="tournament"><a href="https://silph.gg/tournaments/{number}">x</a><div class="arenaBadge" title="Silph Arena"></div>'
+                f'<a class="logo" title="{faction}"></a><h5 class="cupType">★ Great League ★</h5>'
+                f'<h5 class="tourneyName">Local Tournament</h5>{mons_html(team())}</div>')
+
+    def bout_tournament(tier, region, bout_name, cup, player, opponent):
+        return (f'<div class="tournament"><a href="https://silph.gg/factions/cycle/season-2-cycle-4-{tier.lower()}-{region.lower()}">x</a>'
+                f'<div class="arenaBadge" title="Factions Season 2"></div><a class="logo" title="{player["faction"]}"></a>'
+                f'<h5 class="cupType">{cup}</h5><h5 class="tourneyName">{bout_name}</h5>'
+                f'<div class="win"><h3 class="value">{player["wins"]}</h3></div>'
+                f'<div class="loss"><h3 class="value">{opponent["wins"]}</h3></div>{mons_html(player["pokemon"])}</div>')
+
+    for tier in tiers:
+        for region in regions:
+            factions = [f"{tier}{region}Faction{i}" for i in range(factions_per_page)]
+            members = {faction: [f"{faction}Member{i}" for i in range(members_per_faction)] for faction in factions}
+            cards = {member: [] for faction in factions for member in members[faction]}
+            write(url_base + tier + "-" + region,
+                  "<html><body>" + "".join(f'<div class="nameWrapper"><p>{faction}</p><a href="/factions/{faction}">{faction}</a></div>'
+                                           for faction in factions) + "</body></html>")
+            for bout in range(bouts_per_card):
+                # Factions are paired off in each bout, and their members battle in roster order. A faction left
+                # without an opponent sits the bout out.
+                bout_name = "Bout 8: Promotions/Relegations" if bout == 7 else f"Bout {bout + 1}: Week {bout + 1}"
+                cup = f'★ {generator.choice(["Great", "Ultra", "Master"])} League ★'
+                for first, second in zip(factions[::2], factions[1::2]):
+                    for first_member, second_member in zip(members[first], members[second]):
+                        wins = generator.randint(0, 3)
+                        players = [{"username": first_member, "faction": first, "wins": wins, "pokemon": team()},
+                                   {"username": second_member, "faction": second, "wins": 3 - wins, "pokemon": team()}]
+                        for player, opponent in (players, players[::-1]):
+                            cards[player["username"]].append(bout_tournament(tier, region, bout_name, cup, player, opponent))
+                if bout % 7 == 6:
+                    for faction in factions:
+                        for member in members[faction]:
+                            cards[member].append(arena_tournament(bout, faction))
+            for faction in factions:
+                write("/factions/" + faction, "<html><body>" + "".join(f'<p class="playerName">{member} </p>' for member in members[faction]) + "</body></html>")
+            for member, tournaments in cards.items():
+                write("/" + member, '<html><body><div class="profile">' + member + '</div><div class="display bouts">'
+                      + "".join(tournaments) + "</div></body></html>")
+    return url_base
+
+def load_card_fixtures(fixture_dir = fixture_cache):
+    """
+    Helper function to load every recorded Silph Card from the fixture directory.
+    Arguments:
+    - fixture_dir:
+        path string for the fixture directory. Default is "__fixtures__"
+    Returns:
+        list of (username, bytes of raw HTML) tuples
+    """
+    cards = []
+    for username in recorded_usernames(fixture_dir):
+        with open(fixture_path(fixture_dir, username), "rb") as f:
+            cards.append((username, f.read()))
+    return cards
+
+def load_roster_fixtures(fixture_dir = fixture_cache):
+    """
+    Helper function to load every recorded tier and region page and faction page from the fixture directory.
+    Arguments:
+    - fixture_dir:
+        path string for the fixture directory. Default is "__fixtures__"
+    Returns:
+    - (url_base, tier_pages, faction_pages):
+        str of the url_base path of the tier and region pages (None if there are none), list of
+        (tier, region, bytes of raw HTML) tuples, and list of bytes of raw HTML of the faction pages
+    """
+    url_base, tier_pages, faction_pages = None, [], []
+    for filename in sorted(os.listdir(fixture_dir)):
+        path = unquote(filename[:-len(".html")])
+        if not filename.endswith(".html") or not path.startswith("factions/"):
+            continue
+        with open(os.path.join(fixture_dir, filename), "rb") as f:
+            content = f.read()
+        tier_page = tier_page_pattern.fullmatch(path)
+        if tier_page:
+            url_base = "/" + tier_page[1]
+            tier_pages.append((tier_page[2], tier_page[3], content))
+        else:
+            faction_pages.append(content)
+    return url_base, tier_pages, faction_pages
+
+def _best_time(func, repeat = 3):
+    """
+    Helper function to call func repeat times.
+    Returns:
+        (float of the fastest call in seconds, the return value of the last call)
+    """
+    best_time = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = func()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time, result
+
+def _timing(seconds, items, **extra):
+    """
+    Helper function to format a timing for the benchmark report.
+    """
+    return {"seconds": seconds, "items": items, "seconds_per_item": seconds / max(items, 1), **extra}
+
+def benchmark_card_parse(cards, parsers = ("html.parser", "lxml"), repeat = 3):
+    """
+    Function to time parsing of Silph Cards for each HTML parser backend, without any network time.
+    The rows produced by every backend are checked against those of the first backend.
+    Arguments:
+    - cards:
+        list of (username, bytes of raw HTML) tuples, e.g. from load_card_fixtures()
+    - parsers:
+        iterable of strs of BeautifulSoup parser backends. Backends that are not installed are skipped.
+    - repeat:
+        int for the number of passes over the cards. The fastest pass is reported.
+    Returns:
+    - results:
+        a dict of {parser: {"seconds_per_card": float, "rows": int, "identical": bool}}
+    """
+    results = {}
+    reference_rows = None
+    original_parser = sf.html_parser
+    try:
+        for parser in parsers:
+            try:
+                sf.set_html_parser(parser)
+            except FeatureNotFound:
+                print(f"Skipping {parser}, the backend is not installed")
+                continue
+            best_time, rows = _best_time(lambda: [row for username, content in cards for row in sf.parse_silph_card_rows(content, username)], repeat)
+            if reference_rows is None:
+                reference_rows = rows
+            results[parser] = {"seconds_per_card": best_time / max(len(cards), 1),
+                               "rows": len(rows),
+                               "identical": rows == reference_rows}
+    finally:
+        sf.html_parser = original_parser
+    return results
+
+def benchmark_roster_parse(tier_pages, faction_pages, repeat = 3):
+    """
+    Function to time parsing of tier and region pages and faction pages, as done by tier_region_scrape().
+    Arguments:
+    - tier_pages, faction_pages:
+        as returned by load_roster_fixtures()
+    - repeat:
+        int for the number of passes over the pages. The fastest pass is reported.
+    Returns:
+        a dict of {benchmark name: timing}
+    """
+    tier_time, factions = _best_time(lambda: [sf.parse_tier_region_page(content) for _, _, content in tier_pages], repeat)
+    faction_time, members = _best_time(lambda: [sf.parse_faction_page(content) for content in faction_pages], repeat)
+    return {"parse_tier_region_page": _timing(tier_time, len(tier_pages), factions=sum(map(len, factions))),
+            "parse_faction_page": _timing(faction_time, len(faction_pages), members=sum(map(len, members)))}
+
+def benchmark_result_parse(cards, repeat = 3):
+    """
+    Function to time tournament_result_parse() and pokemon_name_clean() on their own, over the tournaments and
+    Pokemon of already parsed Silph Cards.
+    Arguments:
+    - cards:
+        list of (username, bytes of raw HTML) tuples, e.g. from load_card_fixtures()
+    - repeat:
+        int for the number of passes. The fastest pass is reported.
+    Returns:
+        a dict of {benchmark name: timing}
+    """
+    tournaments = [(username, result) for username, content in cards
+                   for result in BeautifulSoup(content, sf.html_parser, parse_only=sf.card_strainer).find_all("div", class_="tournament")]
+    pokemon = [mon for _, result in tournaments for mon in result.find_all(class_="pokemon")]
+    result_time, rows = _best_time(lambda: [sf.tournament_result_parse(result, username) for username, result in tournaments], repeat)
+    clean_time, _ = _best_time(lambda: [sf.pokemon_name_clean(mon) for mon in pokemon], repeat)
+    return {"tournament_result_parse": _timing(result_time, len(tournaments), rows=sum(1 for row in rows if row)),
+            "pokemon_name_clean": _timing(clean_time, len(pokemon))}
+
+def synthetic_results(rows, seed = 0):
+    """
+    Function to generate a results DataFrame of the given size with the columns and cardinalities of a real scrape,
+    for timing queries at sizes beyond what has been scraped.
+    Arguments:
+    - rows:
+        int of the number of rows.
+    - seed:
+        int seeding the generated values, so the same rows are generated across runs.
+    Returns:
+        pd.DataFrame with columns results_categories
+    """
+    generator = np.random.default_rng(seed)
+    mons = np.array([f"Mon{i}" for i in range(300)] + ["N/A"], dtype=object)
+    choose = lambda values: np.asarray(values, dtype=object)[generator.integers(0, len(values), rows)]
+    results = {"region": choose(sf.factions_regions),
+               "tier": choose(sf.factions_tiers),
+               "faction": choose([f"Faction{i}" for i in range(max(rows // 500, 1))]),
+               "player": choose([f"Player{i}" for i in range(max(rows // 20, 1))]),
+               "format": choose(["Great", "Ultra", "Master"]),
+               "season": np.full(rows, 2),
+               "cycle": generator.integers(1, 5, rows),
+               "bout": generator.integers(1, 10, rows),
+               "record": choose(["3-0", "2-1", "1-2", "0-3"])}
+    for mon in ["mon1", "mon2", "mon3", "mon4", "mon5", "mon6"]:
+        results[mon] = mons[generator.integers(0, len(mons), rows)]
+    return sf.pd.DataFrame(results, columns=sf.results_categories)
+
+def benchmark_subset_results(sizes = benchmark_sizes, repeat = 3):
+    """
+    Function to time enumerate_bouts() and add_filter() followed by subset_results() over synthetic results, both
+    from a DataFrame and from a prebuilt ResultsIndex, and with a Pokemon restriction.
+    Arguments:
+    - sizes:
+        list of ints of the numbers of rows to time. Default is benchmark_sizes.
+    - repeat:
+        int for the number of runs at each size. The fastest run is reported.
+    Returns:
+        a dict of {benchmark name: timing}
+    """
+    timings = {}
+    for size in sizes:
+        results = synthetic_results(size)
+        build_filters = lambda: sf.add_filter(sf.add_filter(sf.enumerate_bouts((2, 1, 1), (2, 4, 9)), "tier", ["Gold", "Silver"]), "region", "NA")
+        filter_time, filter_list = _best_time(build_filters, repeat)
+        index_time, results_index = _best_time(lambda: sf.ResultsIndex(results), repeat)
+        frame_time, subset = _best_time(lambda: sf.subset_results(results, filter_list), repeat)
+        indexed_time, _ = _best_time(lambda: sf.subset_results(results_index, filter_list), repeat)
+        mons_time, mons_subset = _best_time(lambda: sf.subset_results(results_index, filter_list, mons=["Mon1", "Mon2"]), repeat)
+        timings[f"enumerate_bouts+add_filter[{size}]"] = _timing(filter_time, len(filter_list))
+        timings[f"ResultsIndex[{size}]"] = _timing(index_time, size)
+        timings[f"subset_results[{size}]"] = _timing(frame_time, size, rows=len(subset))
+        timings[f"subset_results_indexed[{size}]"] = _timing(indexed_time, size, rows=len(subset))
+        timings[f"subset_results_mons[{size}]"] = _timing(mons_time, size, rows=len(mons_subset))
+    return timings
+
+# Run in a fresh interpreter and working directory, so the caches and journal of the scrape start empty
+# and never touch those of the caller.
+full_scrape_script = """
+import sys, json, time
+import silph_factions_scraper as sf
+server_url, url_base, tiers, regions, max_workers = sys.argv[1], sys.argv[2], json.loads(sys.argv[3]), json.loads(sys.argv[4]), int(sys.argv[5])
+sf.silph_url_base, sf.card_url_base = server_url, server_url + "/"
+sf.host_rate_limiter = sf.HostRateLimiter(1e9, 1e9)
+start_time = time.perf_counter()
+results = sf.full_scrape(tiers, regions, server_url + url_base, max_workers=max_workers)
+print(json.dumps({"seconds": time.perf_counter() - start_time, "rows": len(results)}))
+"""
+
+def benchmark_full_scrape(fixture_dir = fixture_cache, max_workers = benchmark_workers, latency = 0):
+    """
+    Function to time full_scrape() end to end against a MockSilphServer serving the fixtures, with the per-host
+    rate limit lifted. Each run starts from empty caches in a temporary directory.
+    Arguments:
+    - fixture_dir:
+        path string for the fixture directory. Default is "__fixtures__"
+    - max_workers:
+        list of ints of the max_workers values to time. Default is benchmark_workers.
+    - latency:
+        time in float amount of seconds the server waits before each response. Default is 0.
+    Returns:
+        a dict of {benchmark name: timing}, including the requests and bytes recorded in the scrape's metrics
+    """
+    url_base, tier_pages, _ = load_roster_fixtures(fixture_dir)
+    if url_base is None:
+        print(f"Skipping full_scrape, no tier and region pages in {fixture_dir}")
+        return {}
+    tiers = list(dict.fromkeys(tier for tier, _, _ in tier_pages))
+    regions = list(dict.fromkeys(region for _, region, _ in tier_pages))
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.dirname(os.path.abspath(sf.__file__)), os.environ.get("PYTHONPATH", "")]))
+    timings = {}
+    with MockSilphServer(fixture_dir, latency) as server:
+        for workers in max_workers:
+            with tempfile.TemporaryDirectory() as run_dir:
+                output = subprocess.run([sys.executable, "-c", full_scrape_script, server.url, url_base, json.dumps(tiers), json.dumps(regions), str(workers)],
+                                        cwd=run_dir, env=environment, capture_output=True, text=True, check=True).stdout
+                run = json.loads(output.strip().splitlines()[-1])
+                with open(os.path.join(run_dir, sf.metrics_summary_path)) as f:
+                    counters = json.load(f)["counters"]
+            timings[f"full_scrape[max_workers={workers}]"] = _timing(run["seconds"], run["rows"],
+                                                                     requests=sum(counters.get("requests", {}).values()),
+                                                                     bytes=sum(counters.get("bytes_downloaded", {}).values()))
+    return timings
+
+def _git_commit():
+    """
+    Helper function to get the commit being benchmarked, or None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(sf.__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(fixture_dir = fixture_cache, sizes = benchmark_sizes, max_workers = benchmark_workers, repeat = 3, latency = 0):
+    """
+    Function to run every benchmark.
+    Arguments:
+    - fixture_dir:
+        path string for the fixture directory, e.g. filled by record_fixtures() or write_synthetic_fixtures().
+    - sizes:
+        list of ints of the synthetic result sizes for subset_results(). Default is benchmark_sizes.
+    - max_workers:
+        list of ints of the max_workers values for full_scrape(). Default is benchmark_workers.
+    - repeat:
+        int for the number of passes of each benchmark. The fastest pass is reported.
+    - latency:
+        time in float amount of seconds the mock server waits before each response. Default is 0.
+    Returns:
+    - report:
+        a JSON serializable dict with "meta" describing the run (commit, Python version, platform, parser, fixtures)
+        and "benchmarks" of {benchmark name: timing}, where each timing has at least "seconds" and "items"
+    """
+    cards = load_card_fixtures(fixture_dir)
+    _, tier_pages, faction_pages = load_roster_fixtures(fixture_dir)
+    benchmarks = {}
+    for parser, timing in benchmark_card_parse(cards, repeat=repeat).items():
+        benchmarks[f"parse_silph_card_rows[{parser}]"] = _timing(timing["seconds_per_card"] * len(cards), len(cards),
+                                                                  rows=timing["rows"], identical=timing["identical"])
+    benchmarks.update(benchmark_roster_parse(tier_pages, faction_pages, repeat))
+    benchmarks.update(benchmark_result_parse(cards, repeat))
+    benchmarks.update(benchmark_subset_results(sizes, repeat))
+    benchmarks.update(benchmark_full_scrape(fixture_dir, max_workers, latency))
+    meta = {"commit": _git_commit(), "timestamp": time.time(), "python": platform.python_version(), "platform": platform.platform(),
+            "parser": sf.html_parser, "repeat": repeat,
+            "fixtures": {"cards": len(cards), "tier_pages": len(tier_pages), "faction_pages": len(faction_pages),
+                         "synthetic": os.path.exists(os.path.join(fixture_dir, synthetic_marker))}}
+    return {"meta": meta, "benchmarks": benchmarks}
+
+def compare_benchmarks(baseline, current, threshold = regression_threshold):
+    """
+    Function to compare two benchmark reports, e.g. from the parent commit and the current one.
+    Arguments:
+    - baseline, current:
+        dicts as returned by run_benchmarks(), or loaded from its JSON output.
+    - threshold:
+        float of the slowdown, as a fraction of the baseline time, above which a benchmark counts as a regression.
+        Default is regression_threshold.
+    Returns:
+    - (ratios, regressions):
+        dict of {benchmark name: current seconds / baseline seconds} for benchmarks in both reports, and the list
+        of benchmark names whose ratio is above 1 + threshold
+    """
+    ratios = {}
+    for name, timing in current["benchmarks"].items():
+        baseline_timing = baseline["benchmarks"].get(name)
+        if baseline_timing and baseline_timing["seconds"] > 0:
+            ratios[name] = timing["seconds"] / baseline_timing["seconds"]
+    return ratios, [name for name, ratio in ratios.items() if ratio > 1 + threshold]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='Silph Benchmark',
+                    description='Times the hot paths of the scraper over recorded Silph pages and synthetic results')
+    parser.add_argument('--fixture_dir', help="Directory of recorded pages, e.g. from silph_mock_server.py --record_rosters", default=fixture_cache)
+    parser.add_argument('--synthetic', help="Write a synthetic corpus of pages to fixture_dir before benchmarking, instead of using recorded pages.", action='store_true')
+    parser.add_argument('--repeat', help="Number of passes of each benchmark", type=int, default=3)
+    parser.add_argument('--sizes', help="Numbers of synthetic rows for subset_results", type=int, nargs='+', default=benchmark_sizes)
+    parser.add_argument('--max_workers', help="max_workers values for the end-to-end full_scrape", type=int, nargs='+', default=benchmark_workers)
+    parser.add_argument('--latency', help="Seconds of simulated latency per request for full_scrape", type=float, default=0)
+    parser.add_argument('--parser', help="HTML parser backend, either html.parser or lxml.", default=sf.html_parser)
+    parser.add_argument('--output', help="Path to write the JSON report to. Printed if not given.")
+    parser.add_argument('--compare', help="Path of a baseline JSON report. Exits with status 1 if any benchmark regressed.")
+    parser.add_argument('--threshold', help="Slowdown over the baseline counted as a regression", type=float, default=regression_threshold)
+
+    args = parser.parse_args()
+    if args.synthetic:
+        write_synthetic_fixtures(args.fixture_dir)
+    elif not os.path.isdir(args.fixture_dir) or not recorded_usernames(args.fixture_dir):
+        parser.error(f"No recorded pages in {args.fixture_dir}. Record a corpus first, e.g. with "
+                     "python silph_mock_server.py --record_rosters Gold-NA, or pass --synthetic.")
+    sf.set_html_parser(args.parser)
+    report = run_benchmarks(args.fixture_dir, args.sizes, args.max_workers, args.repeat, args.latency)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    else:
+        print(json.dumps(report, indent=4))
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("fixtures") != report["meta"]["fixtures"]:
+            print(f"Warning: the baseline was run over different fixtures ({baseline['meta'].get('fixtures')}), so timings may not be comparable.")
+        ratios, regressions = compare_benchmarks(baseline, report, args.threshold)
+        for name, ratio in ratios.items():
+            print(f"{name}: {ratio:.2f}x baseline" + (" REGRESSION" if name in regressions else ""))
+        if regressions:
+            sys.exit(1)
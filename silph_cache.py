@@ -0,0 +1,247 @@
+# Single-file cache store for scraped pages, backed by SQLite
+import time
+import pickle
+import sqlite3
+import threading
+from functools import wraps
+
+# Writes between recounts of the total size from the table, which also picks up writes from other processes.
+size_recount_interval = 1000
+# Entries deleted per query while evicting.
+eviction_batch_size = 256
+
+class CacheStore:
+    """
+    Cache of pickled values kept in a single SQLite file. Entries live in a namespace (e.g. "roster" or
+    "card") under a string key, and record when they were written and last read so they can expire after
+    a TTL and be evicted least-recently-used first once the store grows past max_bytes. Every write is a
+    single transaction, so a crash never leaves a truncated entry behind. The total size is kept as a running
+    count, so a write only scans the table when it has to evict.
+
+    Arguments:
+    - path:
+        path string for the SQLite file. Can be absolute or relative.
+    - max_bytes:
+        (Optional) int for the maximum total size of the pickled values. Defaults to unbounded.
+    """
+    def __init__(self, path, max_bytes = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.namespace_counts = {}
+        self._size = None
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        """
+        Helper function to get the SQLite connection of the calling thread, since connections cannot be shared across threads.
+        The file and its table are only created on first use, so opening a store has no side effects.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                connection.execute("""CREATE TABLE IF NOT EXISTS cache (
+                                          namespace TEXT NOT NULL,
+                                          key TEXT NOT NULL,
+                                          value BLOB NOT NULL,
+                                          size INTEGER NOT NULL,
+                                          created REAL NOT NULL,
+                                          accessed REAL NOT NULL,
+                                          PRIMARY KEY (namespace, key))""")
+                connection.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)")
+            self._local.connection = connection
+        return connection
+
+    def _count(self, counter, namespace = None):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            if namespace is not None:
+                counts = self.namespace_counts.setdefault(namespace, {"hits": 0, "misses": 0, "expired": 0})
+                counts[counter] += 1
+
+    def get(self, namespace, key, ttl = None):
+        """
+        Function to look up an entry.
+        Arguments:
+        - namespace:
+            str of the namespace of the entry.
+        - key:
+            str of the key of the entry.
+        - ttl:
+            (Optional) time in seconds after which an entry is treated as missing. Defaults to never expiring.
+        Returns:
+        - (found, value):
+            bool for whether a fresh entry exists, and its value (None if not found)
+        """
+        connection = self._connection()
+        row = connection.execute("SELECT value, created FROM cache WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        now = time.time()
+        if row is None:
+            self._count("misses", namespace)
+            return False, None
+        if ttl is not None and row[1] + ttl < now:
+            self._count("expired", namespace)
+            self._count("misses", namespace)
+            return False, None
+        with connection:
+            connection.execute("UPDATE cache SET accessed = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+        self._count("hits", namespace)
+        return True, pickle.loads(row[0])
+
+    def set(self, namespace, key, value):
+        """
+        Function to write an entry, replacing any existing entry under the same key, then evict the least
+        recently used entries if the store is larger than max_bytes.
+        """
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            previous = connection.execute("SELECT size FROM cache WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+            connection.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)", (namespace, key, blob, len(blob), now, now))
+        if self.max_bytes is not None and self._add_size(len(blob) - (previous[0] if previous else 0)) > self.max_bytes:
+            self.evict(self.max_bytes)
+
+    def _add_size(self, delta):
+        """
+        Helper function to update the running total size after a write, recounting it from the table when it is
+        unknown and every size_recount_interval writes. Returns the total size.
+        """
+        with self._lock:
+            self._writes += 1
+            if self._size is not None and self._writes % size_recount_interval:
+                self._size += delta
+                return self._size
+        return self._recount()
+
+    def _recount(self):
+        """
+        Helper function to recount the total size from the table. Returns the total size.
+        """
+        size = self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        with self._lock:
+            self._size = size
+        return size
+
+    def _forget_size(self):
+        """
+        Helper function to recount the total size on the next write, after entries were deleted.
+        """
+        with self._lock:
+            self._size = None
+
+    def delete(self, namespace, key):
+        """
+        Function to delete a single entry.
+        Returns:
+            bool for whether an entry was deleted
+        """
+        connection = self._connection()
+        with connection:
+            deleted = connection.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)).rowcount > 0
+        self._forget_size()
+        return deleted
+
+    def evict(self, max_bytes):
+        """
+        Function to delete least recently used entries until the total size is at most max_bytes.
+        Returns:
+            int of the number of entries deleted
+        """
+        connection = self._connection()
+        evicted = 0
+        with connection:
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            # Only the least recently used entries are read, a batch at a time, through the index on accessed.
+            while total > max_bytes:
+                batch = connection.execute("SELECT namespace, key, size FROM cache ORDER BY accessed LIMIT ?",
+                                           (eviction_batch_size,)).fetchall()
+                if not batch:
+                    break
+                for namespace, key, size in batch:
+                    if total <= max_bytes:
+                        break
+                    connection.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key))
+                    total -= size
+                    evicted += 1
+        with self._lock:
+            self._size = total
+            self.evicted += evicted
+        return evicted
+
+    def expire(self, ttl, namespace = None):
+        """
+        Function to delete every entry written more than ttl seconds ago, optionally only within one namespace.
+        Returns:
+            int of the number of entries deleted
+        """
+        query, params = "DELETE FROM cache WHERE created < ?", [time.time() - ttl]
+        if namespace is not None:
+            query, params = query + " AND namespace = ?", params + [namespace]
+        connection = self._connection()
+        with connection:
+            deleted = connection.execute(query, params).rowcount
+        self._forget_size()
+        return deleted
+
+    def clear(self, namespace = None):
+        """
+        Function to delete every entry, optionally only within one namespace.
+        Returns:
+            int of the number of entries deleted
+        """
+        connection = self._connection()
+        with connection:
+            if namespace is None:
+                deleted = connection.execute("DELETE FROM cache").rowcount
+            else:
+                deleted = connection.execute("DELETE FROM cache WHERE namespace = ?", (namespace,)).rowcount
+        self._forget_size()
+        return deleted
+
+    def stats(self):
+        """
+        Function to summarize the store.
+        Returns:
+            a dict of {str: int} with hit/miss/expired/evicted counters since the store was opened,
+            and the current number of entries and bytes, plus "namespaces" with the hit/miss/expired
+            counters of each namespace
+        """
+        entries, size = self._connection().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        with self._lock:
+            namespace_counts = {namespace: dict(counts) for namespace, counts in self.namespace_counts.items()}
+        return {"hits": self.hits, "misses": self.misses, "expired": self.expired, "evicted": self.evicted,
+                "entries": entries, "bytes": size,
+                "namespaces": namespace_counts}
+
+    def cached(self, namespace, key, ttl = None):
+        """
+        Decorator that caches a function's return value in the store, in the spirit of ediblepickle's checkpoint.
+        Arguments:
+        - namespace:
+            str of the namespace for the function's entries.
+        - key:
+            callable of the form lambda args, kwargs: str that names the entry for a call.
+        - ttl:
+            (Optional) time in seconds, or callable returning it, after which an entry is refetched.
+            A callable is read on every call so the TTL can be changed at runtime.
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapped(*args, **kwargs):
+                cache_key = key(args, kwargs)
+                found, value = self.get(namespace, cache_key, ttl() if callable(ttl) else ttl)
+                if found:
+                    return value
+                value = func(*args, **kwargs)
+                self.set(namespace, cache_key, value)
+                return value
+            return wrapped
+        return decorator
@@ -1,13 +1,22 @@
 # Page requests and web scraping
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup, SoupStrainer
 import re
-import csv
 import time
 from datetime import date
 import argparse
-from requests.exceptions import ConnectionError
+from requests.exceptions import ConnectionError, Timeout
 from ssl import SSLEOFError
+from urllib.parse import urlparse
+from silph_scheduler import FetchError, IncompleteScrapeError, ThrottledError, HostRateLimiter, backoff_delay, retry_after_seconds
+
+# Concurrency
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from collections import Counter
+import zlib
 
 # Writing results
 import pandas as pd 
@@ -16,23 +25,65 @@ import tqdm
 # Caching
 import os
 import shutil
-from ediblepickle import checkpoint
-from urllib.parse import quote
+import gzip
+from urllib.parse import quote, unquote
+from silph_cache import CacheStore
+from silph_journal import ScrapeJournal
+
+# Instrumentation
+from silph_metrics import ScrapeMetrics, profile, parse_buckets, rows_buckets
+
+# Querying results
+from silph_query import ResultsIndex
+
+# Normalizing names and bout information
+from silph_normalize import (normalize_pokemon_title, shadow_suffix, normalize_cup_type, parse_bout_url, parse_bout_title, 
+                             is_excluded_event, renormalize_results)
 
-# Global variables to manage the caching directories of the script. 
-player_cache = "__player_cache__" 
-faction_cache = "__faction_cache__"
+# Global variables to manage the caches of the script. Rosters and parsed Silph Cards are kept in a single 
+# SQLite store, keyed by URL and season/cycle, while raw Silph Card HTML is kept in its own directory. 
+scrape_cache = "__scrape_cache__.sqlite"
+html_cache = "__html_cache__"
+scrape_journal = "__scrape_journal__.jsonl"
+player_cache_ttl = 6*24*60*60 # Silph Cards change at most once per weekly bout, so refetch them after 6 days
+roster_cache_ttl = None # Rosters are fixed for a cycle, so they never expire
+current_bout_probes = 8 # Cards refetched by incremental_scrape() to find the latest bout played
+scrape_cache_max_bytes = 1024**3
+
+# Global variables for the metrics written at the end of every full_scrape(). Set a path to None to skip that file. 
+metrics_summary_path = "scrape_metrics.json"
+metrics_textfile_path = "scrape_metrics.prom" # Point at node_exporter's --collector.textfile.directory to export to Prometheus
+metrics = ScrapeMetrics()
+
+# Site Information. The hosts can be pointed at a local mirror (see silph_mock_server.py) for offline runs. 
+silph_url_base = "https://silph.gg"
+card_url_base = "https://sil.ph/"
 
 # Faction Information
 factions_url_base = "https://silph.gg/factions/cycle/season-2-cycle-4-" # Only thing that should be changed from cycle to cycle. 
 factions_tiers = ["Iron", "Copper", "Bronze", "Silver", "Gold", "Platinum", "Diamond", "Emerald"]
 factions_regions = ["NA", "LATAM", "EMEA", "APAC"]
+
+# HTML parser backend used by BeautifulSoup. "lxml" is several times faster than the default "html.parser" 
+# but requires the optional lxml package. Change with set_html_parser(). 
+html_parser = "html.parser"
+
+# Strainers that restrict parsing to the parts of each page that are actually read. 
+tier_region_strainer = SoupStrainer("div", attrs={"class": "nameWrapper"})
+faction_strainer = SoupStrainer(attrs={"class": ["playerName", "playerName long"]})
+card_strainer = SoupStrainer("div", attrs={"class": "display bouts"})
+
+# Columns that identify a single team brought to a bout, used to deduplicate results when merging scrapes. 
+bout_key_categories = ["player", "season", "cycle", "bout", "format"]
+# Columns with few distinct values, stored as categoricals in the partitioned dataset. 
+categorical_categories = ["region", "tier", "faction", "format", "mon1", "mon2", "mon3", "mon4", "mon5", "mon6"]
+partition_categories = ["season", "cycle", "bout"]
 results_categories = ["region", "tier", "faction", "player", "format", "season", "cycle", "bout", "record", "mon1", "mon2", "mon3", "mon4", "mon5", "mon6"]
 
-# Setting up caching directories for checkpoint. 
+# Setting up caching directories. 
 def _setup_cache(path, overwrite = False): 
     """
-    Helper function to set-up a cache directory for the setpoint. 
+    Helper function to set-up a cache directory. 
     Arguments: 
     - cache_dir: 
         path string for cache directory. Can be absolute or relative.
@@ -41,12 +92,184 @@ def _setup_cache(path, overwrite = False):
     """
     if overwrite and os.path.exists(path): 
         shutil.rmtree(path, ignore_errors=True)
-    if not os.path.exists(path):
-        os.mkdir(path)
+    os.makedirs(path, exist_ok=True)
+
+def _cycle_tag(url_base): 
+    """
+    Helper function to get the season/cycle a factions URL points to, e.g. "season-2-cycle-4". 
+    """
+    return url_base.rstrip("-").rsplit("/", 1)[-1]
+
+def _shard_path(path, shard): 
+    """
+    Helper function to give each shard its own copy of a file, e.g. "__scrape_journal__.jsonl" becomes 
+    "__scrape_journal__.shard-0-of-4.jsonl", so shards running on the same machine do not overwrite each other. 
+    """
+    if shard is None: 
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.shard-{shard[0]}-of-{shard[1]}{extension}"
+
+def _card_cache_key(username, url_base = factions_url_base): 
+    """
+    Helper function to get the cache key of a user's Silph Card for the season/cycle of url_base. 
+    """
+    return card_url_base + username + "|" + _cycle_tag(url_base)
+
+cache_store = CacheStore(scrape_cache, max_bytes=scrape_cache_max_bytes)
+
+def set_html_parser(parser): 
+    """
+    Function to set the HTML parser backend used for every Silph page. 
+    Arguments: 
+    - parser: 
+        str of a BeautifulSoup parser, either "html.parser" or "lxml". 
+    Raises FeatureNotFound if the parser is not installed. 
+    """
+    global html_parser
+    BeautifulSoup("", features=parser) # Fails early if the backend is not installed
+    html_parser = parser
+
+# Request scheduling. Requests to each host are limited to a sustained rate with short bursts, and responses with a 
+# status in retry_statuses are retried with exponential backoff, honoring any Retry-After header. 
+requests_per_second = 10
+request_burst = 20
+request_timeout = 30
+max_backoff = 60
+retry_statuses = {429, 500, 502, 503, 504}
+host_rate_limiter = HostRateLimiter(requests_per_second, request_burst)
+
+# Pooled HTTP sessions. Each worker thread keeps its own requests.Session so that keep-alive connections are 
+# reused across Silph Cards instead of paying a new TCP+TLS handshake for every page. 
+_thread_local = threading.local()
+
+def _get_session(pool_size = 10):
+    """
+    Helper function to get the pooled requests.Session for the calling thread. 
+    Arguments: 
+    - pool_size: 
+        int for the maximum number of connections kept alive per host. Default is 10. 
+    Returns: 
+    - session: 
+        requests.Session with an HTTPAdapter mounted for http and https. 
+    """
+    session = getattr(_thread_local, "session", None)
+    if session is None: 
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _thread_local.session = session
+    return session
+
+def fetch_page(url, page_type = "page"): 
+    """
+    Function to request a page using the pooled session of the calling thread, waiting for the rate limit of its host. 
+    Arguments: 
+    - url: 
+        str of the URL to request
+    - page_type: 
+        str labelling the request in metrics, e.g. "roster" or "card". Default is "page". 
+    Returns: 
+        requests.Response of the page
+    Raises ThrottledError if the response status is in retry_statuses. If the response has a Retry-After header, 
+    every request to the host is paused for that long. 
+    """
+    host = urlparse(url).netloc
+    metrics.inc("rate_limit_wait_seconds", host_rate_limiter.acquire(host), page=page_type)
+    try: 
+        with metrics.timer("request_seconds", page=page_type): 
+            page = _get_session().get(url, timeout=request_timeout)
+    except Exception as e: 
+        metrics.inc("request_errors", page=page_type, error=type(e).__name__)
+        raise
+    metrics.inc("requests", page=page_type, status=page.status_code)
+    metrics.inc("bytes_downloaded", len(page.content), page=page_type)
+    if page.status_code in retry_statuses: 
+        retry_after = retry_after_seconds(page)
+        if retry_after: 
+            host_rate_limiter.pause(host, retry_after)
+        raise ThrottledError(url, page.status_code, retry_after)
+    return page
+
+def _with_retries(func, item, connection_timeout = 60, interval = 1): 
+    """
+    Helper function to call func(item), retrying connection errors and throttled responses with exponential backoff. 
+    Arguments: 
+    - func: 
+        callable taking a single item that fetches one or more pages. 
+    - item: 
+        the item to call func with, also used to describe it in messages. 
+    - connection_timeout: 
+        time in integer amount of seconds to keep retrying before giving up. Default is 60 seconds. 
+    - interval: 
+        time in integer amount of seconds bounding the wait before the first retry. The bound doubles after 
+        each failure, up to max_backoff. Default is 1 second. 
+    Returns: 
+        func(item)
+    Raises FetchError once the next retry would start after connection_timeout. 
+    """
+    start_time = time.time()
+    attempt = 0
+    while True: 
+        try: 
+            return func(item)
+        except (ConnectionError, Timeout, SSLEOFError, ThrottledError) as e: 
+            delay = getattr(e, "retry_after", None) or backoff_delay(attempt, interval, max_backoff)
+            if time.time() + delay > start_time + connection_timeout:
+                metrics.inc("fetch_failures")
+                raise FetchError(f"Unable to fetch {item} after {attempt + 1} attempts over {connection_timeout} seconds: {e}") from e
+            print(f"Unable to fetch {item} ({e}). Waiting {delay:.1f} seconds before attempting again...")
+            metrics.inc("retries", error=type(e).__name__)
+            time.sleep(delay)
+            attempt += 1
+
+def _queue_failures(func): 
+    """
+    Helper function to wrap func so that a FetchError returns None instead of raising, letting the caller 
+    queue the item and retry it once everything else is done. 
+    """
+    def wrapped(item): 
+        try: 
+            return func(item)
+        except FetchError as e: 
+            print(f"{e}. Retrying at the end of the scrape...")
+            return None
+    return wrapped
+
+def _imap_concurrent(func, items, max_workers = 1, progress = False): 
+    """
+    Helper function to lazily apply func to every item with at most max_workers calls in flight. 
+    Arguments: 
+    - func: 
+        callable taking a single item. 
+    - items: 
+        list of items to apply func to. 
+    - max_workers: 
+        int for the number of concurrent calls. Default is 1, which runs sequentially in the calling thread. 
+    - progress: 
+        bool for whether to display a tqdm progress bar. Default is False. 
+    Yields: 
+        func(item) in the same order as items
+    """
+    if max_workers > 1 and len(items) > 1: 
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor: 
+            results = executor.map(func, items)
+            yield from (tqdm.tqdm(results, total=len(items)) if progress else results)
+    else: 
+        yield from (func(item) for item in (tqdm.tqdm(items) if progress else items))
+
+def _map_concurrent(func, items, max_workers = 1, progress = False): 
+    """
+    Helper function to apply func to every item with at most max_workers calls in flight. 
+    Takes the same arguments as _imap_concurrent() and returns a list of func(item) in the same order as items. 
+    """
+    return list(_imap_concurrent(func, items, max_workers, progress))
 
 # Set of functions that generate rosters for arbitrary tier and region.        
-@checkpoint(key=lambda args, kwargs: quote(args[0]+"_"+args[1]+".pkl"), work_dir=faction_cache)
-def tier_region_scrape(tier, region, url_base = factions_url_base):
+@cache_store.cached("roster", key=lambda args, kwargs: (args[2] if len(args) > 2 else kwargs.get("url_base", factions_url_base)) + args[0] + "-" + args[1], 
+                    ttl=lambda: roster_cache_ttl)
+def tier_region_scrape(tier, region, url_base = factions_url_base, max_workers = 1, connection_timeout = 60, interval = 1):
     """
     Function to scrape faction roster information for a given tier and region, as specified 
     by Silph Factions. 
@@ -58,31 +281,69 @@ def tier_region_scrape(tier, region, url_base = factions_url_base):
     - url_base: 
         URL that points to latest Silph Season and Cycle; Format is 
         "https://silph.gg/factions/cycle/season-(season#)-cycle-(cycle#)-"
+    - max_workers: 
+        int for the number of faction pages requested at once. Default is 1. 
+    - connection_timeout, interval: 
+        same as in full_scrape(). Each faction page is retried and cached on its own, so a failed page 
+        does not throw away the rest of the tier and region. 
     Returns: 
     - factions_rosters: 
         a dict of {str: list of strs} where the key is the faction name and the value is a 
         list of active factions members. 
     """
-    faction_rosters = {}
-    
     url = url_base + tier + "-" + region
-    page = requests.get(url)
+    page = fetch_page(url, "roster")
     if page.status_code != 200: 
-        return faction_rosters # If the page does not correspond to a valid tier/region, return an empty dict
+        return {} # If the page does not correspond to a valid tier/region, return an empty dict
     
-    soup = BeautifulSoup(page.content, "html.parser")
-    for faction in soup.find_all("div",class_="nameWrapper"): 
-        faction_name = faction.find("p").get_text()
-        faction_url = "https://silph.gg" + faction.find("a").get("href")
-        faction_roster = []
-        faction_page = requests.get(faction_url)
-        faction_soup = BeautifulSoup(faction_page.content, "html.parser")
-        for player in faction_soup.findAll(True, {"class":["playerName", "playerName long"]}): 
-            faction_roster.append(player.get_text().strip())
-        faction_rosters[faction_name] = faction_roster
-    return faction_rosters
+    factions = parse_tier_region_page(page.content)
+    scrape_faction = lambda faction_url: _faction_roster_scrape(faction_url, url_base)
+    faction_roster_list = _map_concurrent(lambda faction: _with_retries(scrape_faction, faction[1], connection_timeout, interval), 
+                                          factions, max_workers)
+    return {faction_name: faction_roster for (faction_name, _), faction_roster in zip(factions, faction_roster_list)}
+
+def parse_tier_region_page(content): 
+    """
+    Function to parse the HTML of a tier and region page into its factions. 
+    Arguments: 
+    - content: 
+        bytes or str of the raw HTML of the page. 
+    Returns: 
+        list of (faction name, faction page URL) tuples of strs
+    """
+    soup = BeautifulSoup(content, html_parser, parse_only=tier_region_strainer)
+    return [(faction.find("p").get_text(), silph_url_base + faction.find("a").get("href")) 
+            for faction in soup.find_all("div",class_="nameWrapper")]
+
+def parse_faction_page(content): 
+    """
+    Function to parse the HTML of a faction page into its active members. 
+    Arguments: 
+    - content: 
+        bytes or str of the raw HTML of the page. 
+    Returns: 
+        list of strs of the active members of the faction
+    """
+    faction_soup = BeautifulSoup(content, html_parser, parse_only=faction_strainer)
+    return [player.get_text().strip() for player in faction_soup.findAll(True, {"class":["playerName", "playerName long"]})]
+
+@cache_store.cached("faction", key=lambda args, kwargs: _cycle_tag(args[1]) + "|" + args[0], ttl=lambda: roster_cache_ttl)
+def _faction_roster_scrape(faction_url, url_base): 
+    """
+    Helper function to scrape the active members listed on a single faction page. 
+    Arguments: 
+    - faction_url: 
+        str of the URL of the faction page
+    - url_base: 
+        URL that points to the Silph Season and Cycle being scraped. Only used to key the cache, since 
+        faction pages have the same URL in every cycle. 
+    Returns: 
+    - faction_roster: 
+        list of strs of the active members of the faction
+    """
+    return parse_faction_page(fetch_page(faction_url, "roster").content)
 
-def generate_rosters(tiers = factions_tiers, regions = factions_regions, url_base = factions_url_base):
+def generate_rosters(tiers = factions_tiers, regions = factions_regions, url_base = factions_url_base, max_workers = 1, connection_timeout = 60, interval = 1, journal = None, skipped = None):
     """
     Function to generate active Silph Factions rosters for a specified season/cycle, tiers 
     and regions. 
@@ -100,14 +361,45 @@ def generate_rosters(tiers = factions_tiers, regions = factions_regions, url_bas
         list of strings that correspond to valid Silph region(s). Must be input as a list, 
         even with 1 element. 
         Default value of ["na", "latam", "emea", "apac"]
+    - max_workers: 
+        int for the maximum number of pages requested at once. The workers are split between 
+        tier/region pages and the faction pages within each of them. Default is 1. 
+    - connection_timeout, interval: 
+        same as in full_scrape(). Tier/regions that still fail are retried once more at the end, then skipped. 
+    - journal: 
+        (Optional) ScrapeJournal to record each tier/region in. Tier/regions already in the journal are not scraped again. 
+    - skipped: 
+        (Optional) list to append the tier/regions that are skipped to, so the caller can report the scrape as incomplete. 
     Returns:
     - faction_rosters: 
         a dictionary of {faction: [members]} in str: list of str format
     """
+    tier_regions = [(tier, region) for tier in tiers for region in regions]
+    # Split the cap between the two levels so no more than max_workers requests are ever in flight. 
+    pair_workers = max(1, min(max_workers, len(tier_regions)))
+    faction_workers = max(1, max_workers // pair_workers)
+    journaled_pairs = dict(journal.rosters) if journal else {}
+    def scrape_pair(pair): 
+        rosters = _with_retries(lambda pair: tier_region_scrape(pair[0], pair[1], url_base, faction_workers, connection_timeout, interval), 
+                                pair, connection_timeout, interval)
+        if journal: 
+            journal.record_roster(pair[0], pair[1], rosters)
+        return rosters
+    pending_pairs = [pair for pair in tier_regions if pair not in journaled_pairs]
+    tier_region_rosters = dict(zip(pending_pairs, _map_concurrent(_queue_failures(scrape_pair), pending_pairs, pair_workers, progress=True)))
     faction_rosters = {}
-    for tier in tqdm.tqdm(tiers):
-        for region in regions: 
-            faction_rosters = {**faction_rosters, **tier_region_scrape(tier, region, url_base)}
+    for pair in tier_regions: 
+        rosters = journaled_pairs[pair] if pair in journaled_pairs else tier_region_rosters[pair]
+        if rosters is None: 
+            # Pages that failed are retried once more after every other tier/region has been scraped. 
+            try: 
+                rosters = scrape_pair(pair)
+            except FetchError as e: 
+                print(f"{e}. Skipping {pair[0]} {pair[1]}.")
+                if skipped is not None: 
+                    skipped.append(f"{pair[0]}-{pair[1]}")
+                continue
+        faction_rosters.update(rosters)
     return faction_rosters
 
 # Set of functions that operate on an individual user's Silph Card to scrape all valid Faction bouts. 
@@ -126,31 +418,8 @@ def pokemon_name_clean(pokemon_html):
     - cleaned_name: 
         reformatted Pokemon name as a str
     """
-    name = pokemon_html["title"]
-    
-    if name == 'Armored Mewtwo': name = 'Mewtwo-Armor'
-    elif "Alolan" in name: name = name.replace('Alolan ', '') + '-Alola'
-    elif "Galarian" in name: name = name.replace('Galarian ', '') + '-Galar'
-    elif "Hisuian" in name: name = name.replace('Hisuian ', '') + '-Hisui'
-    elif "Forme" in name: 
-        pattern = '\s\(*'
-        result = re.split(pattern,name)
-        name = result[0]+"-"+result[1]
-    elif "Cloak" in name: 
-        pattern = '\s\(*'
-        result = re.split(pattern,name)
-        name = result[0]+"-"+result[1]
-    elif "Size" in name: 
-        pattern = '\s\(*'
-        result = re.split(pattern,name)
-        name = result[0]+"-"+result[1]            
-    elif "Castform" in name:
-        if "Snowy" in name: name = 'Castform-Snowy'
-        elif "Rainy" in name: name = 'Castform-Rainy'
-        elif "Sunny" in name: name = 'Castform-Sunny'
-        elif "Normal" in name: name = 'Castform'                
-    
-    if pokemon_html.find("img", class_="shadow"): name = name + '-S'
+    name = normalize_pokemon_title(pokemon_html["title"])
+    if pokemon_html.find("img", class_="shadow"): name = name + shadow_suffix
     
     return name
 
@@ -172,56 +441,15 @@ def tournament_result_parse(result, username):
     """
     
     # Checks if the URL for the given event is a Faction bout and excludes postseason events or any alternative factions-esque bouts
-    excluded = ["Global Melee", "World Championship", "Torneo"]
-    if result.select("a[href*=faction]") == [] or any(map(result.find("div",class_="arenaBadge")["title"].__contains__, excluded)):
+    if result.select_one("a[href*=faction]") is None or is_excluded_event(result.find("div",class_="arenaBadge")["title"]):
         return []
 
     faction = result.find("a", class_="logo")["title"] # Faction at time of battle
+    cup_type = normalize_cup_type(result.find("h5", class_="cupType").text)
 
-    # Conditional formatting to change cupType into proper form, then into database entry
-    cup_type = result.find("h5", class_="cupType").text.strip().strip("★").strip()
-    if "Great" in cup_type: cup_type = "Great"
-    elif "Ultra" in cup_type: cup_type = "Ultra"
-    elif "Master" in cup_type: cup_type = "Master"    
-
-    # Checks URL for bout information (season, cycle, tier) and region
-    bout_url = result.find("a").get("href")
-    region = ""
-    season = -1
-    cycle = -1
-    tier = ""
-    if "may-2021-qualifiers" in bout_url:
-        pattern = "https://silph.gg/factions/cycle/may-2021-qualifiers-(.*)"
-        region = re.findall(pattern,bout_url)[0].upper()
-        season = 0
-        cycle = 1
-        tier = "Qualifiers"
-    elif "preseason-cycle-2-qualifiers" in bout_url:
-        pattern = "https://silph.gg/factions/cycle/preseason-cycle-2-qualifiers-(.*)"
-        region = re.findall(pattern,bout_url)[0].upper()
-        season = 0
-        cycle = 2
-        tier = "Qualifiers"
-    elif "season-" in bout_url:
-        pattern = "https://silph.gg/factions/cycle/season-(.*)-cycle-(.*)-(.*)-(.*)"
-        parsedBoutInfo = re.findall(pattern,bout_url)
-        season = parsedBoutInfo[0][0]
-        cycle = parsedBoutInfo[0][1]
-        tier = parsedBoutInfo[0][2].title()
-        region = parsedBoutInfo[0][3].upper()
-
-    # Manually fixes some inconsistent data parsing
-    if region == "": region = "Not Available"
-    if region == "EU": region = "EMEA"
-    if tier == "": tier = "Not Available"
-
-    # Checks title for bout number
-    bout_info = result.find("h5", class_="tourneyName").text.strip()
-    pattern = "Bout (.*): (.*)"
-    parsed_bout_number = re.findall(pattern,bout_info)
-    #Check to see if this particular bout was part of a promotion/relegation battle
-    if parsed_bout_number[0][1] == "Promotions/Relegations": bout_number = 8 
-    else: bout_number = int(parsed_bout_number[0][0])
+    # Bout information (season, cycle, tier and region) from the URL, and bout number from the title
+    season, cycle, tier, region = parse_bout_url(result.find("a").get("href"))
+    bout_number = parse_bout_title(result.find("h5", class_="tourneyName").text.strip())
 
     record = result.find(class_="win").find("h3", class_="value").text+'-'+result.find(class_="loss").find("h3", class_="value").text
 
@@ -231,32 +459,251 @@ def tournament_result_parse(result, username):
     while len(roster) < 6: 
         roster.append("N/A")
     
-    return [region, tier, faction, username, cup_type, int(season), int(cycle), int(bout_number), record] + roster
+    return [region, tier, faction, username, cup_type, season, cycle, bout_number, record] + roster
 
-@checkpoint(key=lambda args, kwargs: quote(args[0]) + '.pkl', work_dir=player_cache)
-def individual_user_scrape(username):
+# Raw HTML store. Every Silph Card that is fetched is kept as gzip-compressed HTML so that the whole 
+# dataset can be re-parsed offline after a change to the parsing functions. 
+def _html_store_path(username, html_dir = html_cache): 
     """
-    Function to scrape an individual user's results from their Silph Card. 
+    Helper function to get the path of a user's Silph Card in the raw HTML store. 
+    """
+    return os.path.join(html_dir, quote(username, safe="") + ".html.gz")
+
+def fetch_card(username, html_dir = html_cache): 
+    """
+    Function to fetch a user's Silph Card and save its raw HTML to the store. 
     Arguments: 
     - username: 
         String of properly formatted Silph username. 
+    - html_dir: 
+        path string for the raw HTML store. Default is "__html_cache__"
     Returns: 
-        pd.DataFrame of tournament results for an user
+        bytes of the raw HTML of the Silph Card
+    """
+    page = fetch_page(card_url_base + username, "card")
+    if page.status_code == 200: 
+        # Write to a temporary file first so an interrupted write never leaves a truncated entry. 
+        _setup_cache(html_dir)
+        path = _html_store_path(username, html_dir)
+        temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with gzip.open(temp_path, "wb") as f: 
+            f.write(page.content)
+        os.replace(temp_path, path)
+    return page.content
+
+def load_card(username, html_dir = html_cache): 
+    """
+    Function to load a user's Silph Card from the raw HTML store. 
+    Arguments: 
+    - username: 
+        String of properly formatted Silph username. 
+    - html_dir: 
+        path string for the raw HTML store. Default is "__html_cache__"
+    Returns: 
+        bytes of the raw HTML of the Silph Card
+    """
+    with gzip.open(_html_store_path(username, html_dir), "rb") as f: 
+        return f.read()
+
+def stored_usernames(html_dir = html_cache): 
+    """
+    Function to list every username with a Silph Card in the raw HTML store, in sorted order. 
+    """
+    suffix = ".html.gz"
+    if not os.path.exists(html_dir): 
+        return []
+    return sorted(unquote(filename[:-len(suffix)]) for filename in os.listdir(html_dir) if filename.endswith(suffix))
+
+def parse_silph_card_rows(content, username): 
+    """
+    Function to parse the HTML of an individual user's Silph Card into rows. 
+    Arguments: 
+    - content: 
+        bytes or str of the raw HTML of the Silph Card. 
+    - username: 
+        String of properly formatted Silph username. 
+    Returns: 
+    - all_results: 
+        list of rows, each a list of values in results_categories order
     """
     all_results = []
-    #Initializes web scrape
-    page = requests.get("https://sil.ph/" + username)
-    factions_strainer = SoupStrainer("div", attrs={"class": "display bouts"})
-    soup = BeautifulSoup(markup=page.content, features="html.parser", parse_only=factions_strainer)
+    soup = BeautifulSoup(markup=content, features=html_parser, parse_only=card_strainer)
     tournament_results = soup.find_all("div",class_="tournament")
     for result in tournament_results: 
         parsed_result = tournament_result_parse(result, username)
         if parsed_result: 
             all_results.append(parsed_result)
-    return pd.DataFrame(all_results, columns=results_categories)
+    return all_results
+
+def parse_silph_card(content, username): 
+    """
+    Function to parse the HTML of an individual user's Silph Card. 
+    Arguments: 
+    - content: 
+        bytes or str of the raw HTML of the Silph Card. 
+    - username: 
+        String of properly formatted Silph username. 
+    Returns: 
+        pd.DataFrame of tournament results for an user
+    """
+    return pd.DataFrame(parse_silph_card_rows(content, username), columns=results_categories)
+
+@cache_store.cached("card", key=lambda args, kwargs: _card_cache_key(*args, **kwargs), 
+                    ttl=lambda: player_cache_ttl)
+def user_bout_rows(username, url_base = factions_url_base): 
+    """
+    Function to scrape an individual user's results from their Silph Card as plain rows. 
+    Rows are cached instead of DataFrames so that a full scrape never builds a DataFrame per player. 
+    Arguments: 
+    - username: 
+        String of properly formatted Silph username. 
+    - url_base: 
+        URL that points to the Silph Season and Cycle being scraped. Only used to key the cache, 
+        so that results cached during an earlier cycle are not reused. 
+    Returns: 
+        list of rows, each a list of values in results_categories order
+    """
+    #Initializes web scrape
+    content = fetch_card(username)
+    with metrics.timer("card_parse_seconds", parse_buckets): 
+        return parse_silph_card_rows(content, username)
+
+def individual_user_scrape(username):
+    """
+    Function to scrape an individual user's results from their Silph Card. 
+    Arguments: 
+    - username: 
+        String of properly formatted Silph username. 
+    Returns: 
+        pd.DataFrame of tournament results for an user
+    """
+    return pd.DataFrame(user_bout_rows(username), columns=results_categories)
+
+def _scrape_member(member, url_base = factions_url_base, connection_timeout = 60, interval = 1): 
+    """
+    Helper function to scrape a single member's Silph Card, retrying on connection errors and throttled responses. 
+    Arguments: 
+    - member: 
+        str of properly formatted Silph username. 
+    - url_base: 
+        URL that points to the Silph Season and Cycle being scraped. 
+    - connection_timeout: 
+        time in integer amount of seconds to keep retrying before giving up. 
+    - interval: 
+        time in integer amount of seconds bounding the wait before the first retry. 
+    Returns: 
+        list of rows of tournament results for the member
+    Raises FetchError if the Silph Card could not be fetched within connection_timeout. 
+    """
+    return _with_retries(lambda member: user_bout_rows(member, url_base=url_base), member, connection_timeout, interval)
+
+def iter_bouts(tiers = factions_tiers, regions = factions_regions, url_base = factions_url_base, connection_timeout = 60, interval = 1, max_workers = 1, journal = None, shard = None, skipped = None): 
+    """
+    Generator that scrapes the specified factions and yields each bout as soon as its member has been scraped, 
+    so results can be streamed to disk or collected without holding intermediate DataFrames. 
+    Takes the same arguments as full_scrape(), except for clear_player_cache and resume, plus: 
+    - journal: 
+        (Optional) ScrapeJournal to record each roster page and player in. Anything already in the journal 
+        is taken from it instead of being scraped again. 
+    - shard: 
+        (Optional) tuple of ints (i, n) to only scrape the members assigned to shard i of n by shard_of(). 
+    - skipped: 
+        (Optional) list to append the tier/regions and members that are skipped to, as in generate_rosters(). 
+    Yields: 
+        a list of values in results_categories order for each bout, in roster order. Members whose Silph Card 
+        could not be fetched are retried once everything else is done, and their bouts are yielded last. 
+    """
+    print("Generating/loading factions rosters...")
+    factions_rosters = generate_rosters(tiers, regions, url_base, max_workers, connection_timeout, interval, journal, skipped)
+    print("Generating player Pokemon rosters...")
+    members = [member for faction in factions_rosters.keys() for member in factions_rosters[faction]]
+    if shard is not None: 
+        members = [member for member in members if shard_of(member, shard[1]) == shard[0]]
+    journaled_members = dict(journal.players) if journal else {}
+    def scrape_member(member): 
+        member_rows = _scrape_member(member, url_base, connection_timeout, interval)
+        metrics.observe("rows_per_player", len(member_rows), rows_buckets)
+        if journal: 
+            journal.record_player(member, member_rows)
+        return member_rows
+    # Each member is scraped once even if they appear on several rosters, so that no two workers write the 
+    # same cache entry at once. Results come back in submission order, so the output matches a sequential scrape. 
+    pending_members = [member for member in dict.fromkeys(members) if member not in journaled_members]
+    unique_member_rows = _imap_concurrent(_queue_failures(scrape_member), pending_members, max_workers, progress=True)
+    member_counts = Counter(members)
+    repeated_member_rows = {}
+    failed_members = []
+    for member in members: 
+        if member in journaled_members: 
+            member_rows = journaled_members[member]
+        elif member in repeated_member_rows: 
+            member_rows = repeated_member_rows[member]
+        else: 
+            member_rows = next(unique_member_rows)
+            if member_rows is None: 
+                metrics.inc("players_queued")
+                failed_members.append(member)
+                member_rows = []
+            if member_counts[member] > 1: 
+                repeated_member_rows[member] = member_rows
+        yield from member_rows
+
+    for member in failed_members: 
+        try: 
+            member_rows = scrape_member(member)
+        except FetchError as e: 
+            print(f"{e}. Skipping {member}.")
+            metrics.inc("players_skipped")
+            if skipped is not None: 
+                skipped.append(member)
+            continue
+        for _ in range(member_counts[member]): 
+            yield from member_rows
+
+def build_results(rows): 
+    """
+    Function to build the results DataFrame from bout rows in a single pass. 
+    Arguments: 
+    - rows: 
+        iterable of lists of values in results_categories order, e.g. from iter_bouts()
+    Returns: 
+        pd.DataFrame with columns results_categories
+    """
+    return pd.DataFrame(list(rows), columns=results_categories)
+
+def _parse_stored_card(username, html_dir = html_cache, parser = "html.parser"): 
+    """
+    Helper function run in worker processes to parse a single Silph Card from the raw HTML store. 
+    The parser backend is passed explicitly since worker processes do not share module settings. 
+    """
+    global html_parser
+    html_parser = parser
+    return parse_silph_card_rows(load_card(username, html_dir), username)
+
+def reparse_html_store(usernames = None, html_dir = html_cache, max_processes = None): 
+    """
+    Function to rebuild the results DataFrame from the raw HTML store without any network traffic, 
+    parsing Silph Cards across all cores. 
+    Arguments: 
+    - usernames: 
+        (Optional) list of strs of usernames to parse, in the order their rows should appear. 
+        Defaults to every username in the store, in sorted order. 
+    - html_dir: 
+        path string for the raw HTML store. Default is "__html_cache__"
+    - max_processes: 
+        (Optional) int for the number of worker processes. Defaults to the number of cores. 
+    Returns:
+        pd.DataFrame of tournament results with columns results_categories
+    """
+    if usernames is None: 
+        usernames = stored_usernames(html_dir)
+    parse_card = partial(_parse_stored_card, html_dir=html_dir, parser=html_parser)
+    with ProcessPoolExecutor(max_workers=max_processes) as executor: 
+        card_rows = executor.map(parse_card, usernames, chunksize=max(1, len(usernames) // (4 * (os.cpu_count() or 1))))
+        return build_results(row for rows in tqdm.tqdm(card_rows, total=len(usernames)) for row in rows)
 
 # Main function to scrape results for all valid tiers and regions. 
-def full_scrape(tiers = factions_tiers, regions = factions_regions, url_base = factions_url_base, clear_player_cache = False, connection_timeout = 60, interval = 1):
+def full_scrape(tiers = factions_tiers, regions = factions_regions, url_base = factions_url_base, clear_player_cache = False, connection_timeout = 60, interval = 1, max_workers = 1, resume = True, shard = None):
     """
     Fuction to scrape all of the results for all specified factions in given season-cycles, tiers, and regions. 
     Arguments: 
@@ -273,40 +720,309 @@ def full_scrape(tiers = factions_tiers, regions = factions_regions, url_base = f
         URL that points to latest Silph Season and Cycle; Format is 
         "https://silph.gg/factions/cycle/season-(season#)-cycle-(cycle#)-"
         Default value of "https://silph.gg/factions/cycle/season-2-cycle-3-"
+    - clear_player_cache: 
+        bool for whether to drop every cached Silph Card before scraping. Cached cards older 
+        than player_cache_ttl are refetched regardless. Also starts a new journal instead of resuming, 
+        so no player is taken from an earlier run. Default is False. 
     - connection_timeout: 
         time in integer amount of seconds to wait for attempting to 
         scrape a specific user before giving up and moving to the next user. 
+        Users that fail are retried once more at the end of the scrape. 
         Default is 60 seconds. 
     - interval: 
-        time in integer amount of seconds to wait after a failed connection before 
-        attempting to reconnect to the same user. Default is 1 second. 
+        time in integer amount of seconds bounding the wait after a failed connection before 
+        attempting to reconnect to the same user. The bound doubles with each failure, and a 
+        Retry-After header from the site takes precedence. Default is 1 second. 
+    - max_workers: 
+        int for the number of pages requested at once, for both roster discovery and Silph Cards. 
+        Default is 1, which scrapes one page at a time. Results are returned in roster order regardless of this value. 
+    - resume: 
+        bool for whether to continue an unfinished scrape of the same url_base, tiers and regions from the journal 
+        in scrape_journal, as long as it was started within player_cache_ttl. Progress is always journaled, so a 
+        scrape that fails can be resumed by calling full_scrape() again. Default is True. 
+    - shard: 
+        (Optional) tuple of ints (i, n) to scrape only the members assigned to shard i of n by shard_of(), 
+        with 0 <= i < n. Every shard scrapes the rosters, and each keeps its own journal. The outputs of 
+        all n shards are combined with merge_shards(). Defaults to scraping every member. 
+    Metrics for the scrape (request latencies and bytes by page type, card parse times, rows per player, cache 
+    hits and misses, retries and errors) are written to metrics_summary_path and metrics_textfile_path once it 
+    finishes or fails. 
     Returns:
     - bout_data: 
         pd.DataFrame of tournament results for the specified factions
+    Raises IncompleteScrapeError, with the skipped pages and the results of everything else, if any tier/region 
+    or member still failed after being retried at the end. The journal is left unfinished, so calling 
+    full_scrape() again only scrapes what was skipped. 
     """
-    _setup_cache(faction_cache)
-    _setup_cache(player_cache, clear_player_cache)
-    
-    bout_data = pd.DataFrame(columns=results_categories)
-    print("Generating/loading factions rosters...")
-    factions_rosters = generate_rosters(tiers, regions, url_base)
-    print("Generating player Pokemon rosters...")
-    for ind, faction in tqdm.tqdm(enumerate(factions_rosters.keys()), total=len(factions_rosters.keys())):
-        for member in factions_rosters[faction]:
-            start_time = time.time()
-            while True: 
-                try: 
-                    member_scrape = individual_user_scrape(member)
-                    break
-                except (ConnectionError, SSLEOFError): 
-                    if time.time() > start_time + connection_timeout:
-                        raise Exception(f"Unable to connect to {member}'s page after {connection_timeout} seconds of ConnectionErrors")
-                    else: 
-                        print(f"Unable to connect to {member}'s page. Waiting 1 second before attempting again...")
-                        time.sleep(1)
-            bout_data = pd.concat(objs = [bout_data, member_scrape])
+    metrics.reset()
+    cache_counts = cache_store.stats()["namespaces"]
+    try: 
+        return _full_scrape(tiers, regions, url_base, clear_player_cache, connection_timeout, interval, max_workers, resume, shard)
+    finally: 
+        for namespace, counts in cache_store.stats()["namespaces"].items(): 
+            for counter, value in counts.items(): 
+                metrics.set(f"cache_{counter}", value - cache_counts.get(namespace, {}).get(counter, 0), namespace=namespace)
+        metrics.write(metrics_summary_path and _shard_path(metrics_summary_path, shard), 
+                      metrics_textfile_path and _shard_path(metrics_textfile_path, shard))
+
+def _full_scrape(tiers, regions, url_base, clear_player_cache, connection_timeout, interval, max_workers, resume, shard): 
+    """
+    Helper function for full_scrape(), which takes the same arguments. 
+    """
+    if clear_player_cache: 
+        cache_store.clear("card")
+    journal_path = _shard_path(scrape_journal, shard)
+    journal = ScrapeJournal(journal_path, {"url_base": url_base, "tiers": list(tiers), "regions": list(regions), 
+                                           "shard": list(shard) if shard else None}, 
+                            max_age=player_cache_ttl, resume=resume and not clear_player_cache)
+    if journal.rosters or journal.players: 
+        print(f"Resuming scrape from {journal_path}: {journal.summary()}")
+        metrics.set("players_resumed", len(journal.players))
+    skipped = []
+    bout_data = build_results(iter_bouts(tiers, regions, url_base, connection_timeout, interval, max_workers, journal, shard, skipped))
+    if skipped: 
+        # The journal is left unfinished, so the next call resumes with only the skipped pages. 
+        raise IncompleteScrapeError(skipped, bout_data)
+    journal.complete()
+    if shard is not None: 
+        bout_data.attrs.update({"url_base": url_base, "shard": shard[0], "shard_count": shard[1]})
     return bout_data
 
+# Set of functions to split a scrape across several machines and combine their outputs. 
+def shard_of(player, shard_count): 
+    """
+    Function to assign a player to a shard. The assignment only depends on the player name, so it is the 
+    same on every machine and in every run, unlike Python's built-in hash(). 
+    Arguments: 
+    - player: 
+        str of the player's username
+    - shard_count: 
+        int of the number of shards
+    Returns: 
+        int of the player's shard, from 0 to shard_count - 1
+    """
+    return zlib.crc32(player.encode("utf-8")) % shard_count
+
+def parse_shard(shard): 
+    """
+    Function to parse a shard given as "i/n" on the command line. 
+    Returns: 
+        tuple of ints (i, n)
+    """
+    parsed_shard = re.fullmatch("(\\d+)/(\\d+)", shard.strip())
+    if not parsed_shard or not int(parsed_shard[1]) < int(parsed_shard[2]): 
+        raise Exception(f"Unable to parse shard {shard}. Please use the form i/n with 0 <= i < n, e.g. 0/4.")
+    return int(parsed_shard[1]), int(parsed_shard[2])
+
+def merge_shards(partials): 
+    """
+    Function to combine the results of every shard of a scrape into one set of results. Checks that the 
+    partials come from the same scrape, that each of the n shards is present exactly once, and that they 
+    share the same columns and dtypes before merging them. 
+    Arguments: 
+    - partials: 
+        list of pd.DataFrames obtained by running full_scrape() with shard, or paths to their pickles
+    Returns: 
+        pd.DataFrame of the combined results in shard order, with a single row per team as identified 
+        by bout_key_categories
+    """
+    partials = [pd.read_pickle(shard_results) if isinstance(shard_results, str) else shard_results for shard_results in partials]
+    if not partials: 
+        raise Exception("No shards to merge.")
+    for shard_results in partials: 
+        if not {"url_base", "shard", "shard_count"} <= set(shard_results.attrs): 
+            raise Exception("Results are missing their shard. Please merge the outputs of full_scrape() run with shard.")
+        if list(shard_results.columns) != results_categories: 
+            raise Exception(f"Shard {shard_results.attrs['shard']} has columns {list(shard_results.columns)} instead of {results_categories}.")
+    url_base, shard_count = partials[0].attrs["url_base"], partials[0].attrs["shard_count"]
+    if any(shard_results.attrs["url_base"] != url_base or shard_results.attrs["shard_count"] != shard_count for shard_results in partials): 
+        raise Exception("Shards come from different scrapes. Please merge shards with the same url_base and shard count.")
+    shards = Counter(shard_results.attrs["shard"] for shard_results in partials)
+    if sorted(shards) != list(range(shard_count)) or max(shards.values()) > 1: 
+        missing = sorted(set(range(shard_count)) - set(shards))
+        repeated = sorted(shard for shard, count in shards.items() if count > 1)
+        raise Exception(f"Expected each of {shard_count} shards once. Missing shards: {missing}. Repeated shards: {repeated}.")
+    # Empty shards are left out of the dtype check, since their columns hold no values to infer a dtype from. 
+    dtypes = [shard_results.dtypes for shard_results in partials if len(shard_results)]
+    if any(not dtype.equals(dtypes[0]) for dtype in dtypes[1:]): 
+        raise Exception("Shards have different column dtypes. Please rerun the shards with the same version of the scraper.")
+
+    partials = sorted(partials, key=lambda shard_results: shard_results.attrs["shard"])
+    merged = pd.concat(partials, ignore_index=True).drop_duplicates(subset=bout_key_categories, keep="last")
+    merged = merged.reset_index(drop=True)
+    merged.attrs = {}
+    return merged
+
+# Set of functions to update a previous scrape with only the bouts played since. 
+def latest_bouts(results, season, cycle): 
+    """
+    Function to find the latest bout recorded for each player in a given season and cycle. 
+    Arguments: 
+    - results: 
+        a pd.DataFrame obtained by running full_scrape()
+    - season: 
+        int of the season
+    - cycle: 
+        int of the cycle
+    Returns: 
+        pd.Series of the latest bout number, indexed by player
+    """
+    current_cycle = results[(results["season"] == season) & (results["cycle"] == cycle)]
+    return current_cycle.groupby("player")["bout"].max()
+
+def merge_results(previous_results, new_results): 
+    """
+    Function to merge two sets of results, keeping a single row per team as identified by bout_key_categories. 
+    Where both contain the same team, the row from new_results is kept. 
+    Arguments: 
+    - previous_results: 
+        a pd.DataFrame of results with columns results_categories
+    - new_results: 
+        a pd.DataFrame of results with columns results_categories
+    Returns: 
+        pd.DataFrame of the merged results, with previous rows first
+    """
+    merged = pd.concat([previous_results[results_categories], new_results[results_categories]], ignore_index=True)
+    return merged.drop_duplicates(subset=bout_key_categories, keep="last").reset_index(drop=True)
+
+def _probe_current_bout(members, latest, season, cycle, scrape_member, max_workers = 1): 
+    """
+    Helper function to find the latest bout played by refetching the Silph Cards of a few members who already 
+    have the latest recorded bout, spread evenly across the rosters. 
+    Arguments: 
+    - members: 
+        list of strs of the members of every roster
+    - latest: 
+        pd.Series of the latest recorded bout of each player in the current cycle, from latest_bouts()
+    - season, cycle: 
+        ints of the current season and cycle
+    - scrape_member: 
+        callable taking a member and returning their rows, refetching their Silph Card
+    Returns: 
+    - (current_bout, probed_rows): 
+        int of the latest bout on the recorded or refetched cards, and dict of {member: rows} of the 
+        members whose cards were refetched
+    """
+    latest_bout = int(latest.max()) if len(latest) else 0
+    candidates = [member for member in members if latest.get(member, 0) == latest_bout] or members
+    probes = candidates[::max(1, len(candidates) // current_bout_probes)][:current_bout_probes]
+    def probe(member): 
+        try: 
+            return scrape_member(member)
+        except FetchError as e: 
+            print(f"{e}. Skipping {member} as a probe.")
+            return None
+    probed_rows = {member: rows for member, rows in zip(probes, _map_concurrent(probe, probes, max_workers)) if rows is not None}
+    season_column, cycle_column, bout_column = (results_categories.index(column) for column in ("season", "cycle", "bout"))
+    probed_bouts = [row[bout_column] for rows in probed_rows.values() for row in rows 
+                    if row[season_column] == season and row[cycle_column] == cycle]
+    return max([latest_bout] + probed_bouts) or 1, probed_rows
+
+def incremental_scrape(previous_results, current_bout = None, tiers = factions_tiers, regions = factions_regions, url_base = factions_url_base, connection_timeout = 60, interval = 1, max_workers = 1): 
+    """
+    Function to update a previous scrape by refetching only the Silph Cards of members that are likely 
+    to have new results, i.e. members whose latest recorded bout in the current cycle is before current_bout 
+    and members missing from the previous scrape. Other members keep their previous rows. 
+    Arguments: 
+    - previous_results: 
+        a pd.DataFrame obtained by running full_scrape() or incremental_scrape()
+    - current_bout: 
+        (Optional) int of the latest bout that has been played. Defaults to the latest bout found by refetching 
+        the cards of current_bout_probes members who have the latest bout in previous_results for the current cycle. 
+    - tiers, regions, url_base, connection_timeout, interval, max_workers: 
+        same as in full_scrape()
+    Returns: 
+        pd.DataFrame of previous_results merged with the new results, deduplicated on bout_key_categories
+    Raises IncompleteScrapeError, with the skipped pages and the merged results of everything else, if any 
+    tier/region or member still failed after being retried at the end. 
+    """
+    parsed_cycle = re.findall("season-(\\d+)-cycle-(\\d+)", _cycle_tag(url_base))
+    if not parsed_cycle: 
+        raise Exception(f"Unable to find the season and cycle in {url_base}. Please use a URL of the form https://silph.gg/factions/cycle/season-(season#)-cycle-(cycle#)-")
+    season, cycle = int(parsed_cycle[0][0]), int(parsed_cycle[0][1])
+    latest = latest_bouts(previous_results, season, cycle)
+
+    print("Generating/loading factions rosters...")
+    skipped = []
+    factions_rosters = generate_rosters(tiers, regions, url_base, max_workers, connection_timeout, interval, skipped=skipped)
+    members = list(dict.fromkeys(member for faction in factions_rosters.keys() for member in factions_rosters[faction]))
+    def scrape_member(member): 
+        cache_store.delete("card", _card_cache_key(member, url_base))
+        return _scrape_member(member, url_base, connection_timeout, interval)
+    probed_rows = {}
+    if current_bout is None: 
+        current_bout, probed_rows = _probe_current_bout(members, latest, season, cycle, scrape_member, max_workers)
+        print(f"Found bout {current_bout} on the cards of {len(probed_rows)} members.")
+    stale_members = [member for member in members if latest.get(member, 0) < current_bout and member not in probed_rows]
+    print(f"Refetching {len(stale_members)} of {len(members)} members without results for bout {current_bout}...")
+    member_rows = _map_concurrent(_queue_failures(scrape_member), stale_members, max_workers, progress=True)
+    for position, member in enumerate(stale_members): 
+        if member_rows[position] is None: # Failed members are retried once more at the end, then skipped
+            metrics.inc("players_queued")
+            try: 
+                member_rows[position] = scrape_member(member)
+            except FetchError as e: 
+                print(f"{e}. Skipping {member}.")
+                metrics.inc("players_skipped")
+                skipped.append(member)
+    new_results = build_results(row for rows in list(probed_rows.values()) + member_rows if rows is not None for row in rows)
+    if skipped: 
+        raise IncompleteScrapeError(skipped, merge_results(previous_results, new_results))
+    return merge_results(previous_results, new_results)
+
+# Set of functions to save and load results as a Parquet dataset partitioned by bout. Requires the optional pyarrow package. 
+def to_categorical(results): 
+    """
+    Function to convert the low-cardinality columns of results into categoricals. The six Pokemon columns 
+    share a single set of categories, so the same Pokemon has the same code in every slot. 
+    Arguments: 
+    - results: 
+        a pd.DataFrame obtained by running full_scrape()
+    Returns: 
+        a copy of results with categorical_categories stored as categoricals and partition_categories as ints
+    """
+    results = results[results_categories].copy()
+    mon_categories = [f"mon{i}" for i in range(1, 6+1)]
+    mons = pd.unique(pd.concat([results[mon].astype(str) for mon in mon_categories], ignore_index=True))
+    mon_dtype = pd.CategoricalDtype(sorted(mons))
+    for column in categorical_categories: 
+        results[column] = results[column].astype(str).astype(mon_dtype if column in mon_categories else "category")
+    for column in partition_categories: 
+        results[column] = results[column].astype(int)
+    return results
+
+def write_dataset(results, path): 
+    """
+    Function to append results to a Parquet dataset partitioned by season/cycle/bout. Partitions present in 
+    results replace any existing files for the same bout, and every other partition is left untouched, so 
+    each run only writes the bouts it scraped. 
+    Arguments: 
+    - results: 
+        a pd.DataFrame obtained by running full_scrape()
+    - path: 
+        path string of the dataset directory, e.g. "results/silph_factions"
+    """
+    to_categorical(results).to_parquet(path, partition_cols=partition_categories, index=False, 
+                                       existing_data_behavior="delete_matching")
+
+def load_dataset(path, season = None, cycle = None, bout = None): 
+    """
+    Function to load results from a Parquet dataset written by write_dataset(). Only the partitions 
+    matching the given season, cycle and bout are read. 
+    Arguments: 
+    - path: 
+        path string of the dataset directory
+    - season, cycle, bout: 
+        (Optional) ints to restrict the load to. Defaults to loading everything. 
+    Returns: 
+        pd.DataFrame with columns results_categories and categorical_categories as categoricals
+    """
+    filters = [(column, "=", value) for column, value in zip(partition_categories, (season, cycle, bout)) if value is not None]
+    results = pd.read_parquet(path, filters=filters or None)
+    if results.empty: 
+        return to_categorical(pd.DataFrame(columns=results_categories))
+    return to_categorical(results)
+
 # Set of additional functions to further filter the full scrape in a programmatic fashion. 
 def enumerate_bouts(bout_start, bout_end = None):
     """
@@ -405,26 +1121,31 @@ def filtered_results(results,save=False,**kwargs):
     - filtered_results:
         a pd.DataFrame with the same columns as the results DataFrame after applying the relevant filters 
     """
-    filtered_result = results
+    mask = pd.Series(True, index=results.index)
     for key, value in kwargs.items():
-        filtered_result = filtered_result[filtered_result[key] == value].copy()
+        mask &= results[key] == value
+    filtered_result = results[mask.to_numpy()].copy()
     filtered_result.sort_values(["season", "cycle", "bout"], ascending=False)    
     
     if save: 
         filtered_result.to_csv(save)
     return filtered_result
 
-def subset_results(results, filter_list, save=False):
+def subset_results(results, filter_list, save=False, mons=None, require_all=False):
     """
-    Wrapper function to collect the DataFrames of multiple filter conditions. 
+    Wrapper function to collect the DataFrames of multiple filter conditions. All filters are resolved together 
+    through a ResultsIndex instead of filtering the results once per filter. 
     Arguments: 
     - results: 
         a pd.DataFrame obtained by running full_scrape() with the following columns: 
         [region: str, tier: str, faction: str, username: str, cup_type: str, season: 
          int, cycle: int, bout: int, record: str, mon1: str, mon2: str, mon3: str, 
          mon4: str, mon5: str, mon6: str]
+        or a ResultsIndex built over one, which is faster when querying the same results repeatedly. 
     - filter_list: list of dictionaries with filters in {filter: value} format. Each filter has exactly 1 value. 
     - (optional) save: Default to False. If a csv file is desired, set save = name of file in str form, e.g., "S2_C3_B1.csv"
+    - (optional) mons: a str or list of strs of Pokemon names. If given, only teams with these Pokemon in any slot are kept. 
+    - (optional) require_all: Default to False. If True, teams must contain every Pokemon in mons rather than any of them. 
     
     Output: 
     - subset: 
@@ -433,38 +1154,71 @@ def subset_results(results, filter_list, save=False):
          int, cycle: int, bout: int, record: str, mon1: str, mon2: str, mon3: str, 
          mon4: str, mon5: str, mon6: str]
     """
-    subset = pd.DataFrame(columns=results.columns)
-    for filters in filter_list: 
-        subset = pd.concat([subset, filtered_results(results, **filters)])
+    results_index = results if isinstance(results, ResultsIndex) else ResultsIndex(results)
+    subset = results_index.query(filter_list, mons, require_all)
     subset.sort_values(["season", "cycle", "bout"], ascending=False)
     
     if save: 
         subset.to_csv(save)
     return subset
 
-_setup_cache("__player_cache__")
-_setup_cache("__faction_cache__")
-
 if __name__ == "__main__": 
     parser = argparse.ArgumentParser(
                     prog='Silph Factions Scraper',
                     description='Scrapes roster information for Silph Factions')
     parser.add_argument('--savepath', help="Directory to save results")
     parser.add_argument('--clear_player_cache', help="Clear player cache if scraping for a new bout.", action='store_true')
+    parser.add_argument('--max_workers', help="Number of Silph Cards to request at once.", type=int, default=1)
+    parser.add_argument('--parser', help="HTML parser backend, either html.parser or lxml.", default=html_parser)
+    parser.add_argument('--reparse', help="Rebuild results from the raw HTML store without scraping.", action='store_true')
+    parser.add_argument('--format', help="Output format: a dated pickle, or a Parquet dataset partitioned by bout.", choices=['pickle', 'parquet'], default='pickle')
+    parser.add_argument('--incremental', help="Path to a previous results pickle to update with only new bouts.")
+    parser.add_argument('--renormalize', help="Path to a previous results pickle to rewrite with the current Pokemon name normalization.")
+    parser.add_argument('--max_restarts', help="Number of times to resume the scrape after an error.", type=int, default=10)
+    parser.add_argument('--current_bout', help="Latest bout played, for --incremental. Defaults to the latest bout on a few refetched cards.", type=int)
+    parser.add_argument('--profile', help="Path to write cProfile stats of the run to, e.g. run.prof. Best used with --max_workers 1.")
+    parser.add_argument('--shard', help="Scrape only shard i of n of the members, given as i/n with 0 <= i < n. Writes a partial pickle to combine with merge.")
+    subparsers = parser.add_subparsers(dest='command')
+    merge_parser = subparsers.add_parser('merge', help="Combine the partial pickles of every shard into one set of results.")
+    merge_parser.add_argument('partials', help="Partial pickles written with --shard.", nargs='+')
 
     args = parser.parse_args()
     clear_player_cache = args.clear_player_cache
     savepath = args.savepath
+    max_workers = args.max_workers
+    set_html_parser(args.parser)
 
+    if args.shard and (args.command or args.reparse or args.renormalize or args.incremental): 
+        parser.error("--shard only splits a full scrape, and cannot be combined with merge, --reparse, --renormalize or --incremental.")
+    shard = parse_shard(args.shard) if args.shard else None
     results = None
-    try: 
-        results = full_scrape(clear_player_cache = clear_player_cache)
-    except Exception: 
-        while results == None: 
-            print("Error while scraping. Restarting scrape...")
-            results = full_scrape(clear_player_cache = False)
+    with profile(args.profile): 
+        if args.command == 'merge': 
+            results = merge_shards(args.partials)
+        elif args.reparse: 
+            results = reparse_html_store()
+        elif args.renormalize: 
+            results = renormalize_results(pd.read_pickle(args.renormalize))
+        elif args.incremental: 
+            results = incremental_scrape(pd.read_pickle(args.incremental), args.current_bout, max_workers = max_workers)
+        else: 
+            # Progress is journaled, so each restart continues from where the failed attempt stopped. 
+            for attempt in range(args.max_restarts + 1): 
+                try: 
+                    results = full_scrape(clear_player_cache = clear_player_cache and attempt == 0, max_workers = max_workers, shard = shard)
+                    break
+                except Exception as e: 
+                    if attempt == args.max_restarts: 
+                        raise
+                    print(f"Error while scraping ({e}). Restarting scrape...")
 
-    if savepath: 
+    if "shard" in results.attrs: 
+        # Partials are always pickled, since they keep the shard in results.attrs and shards must not 
+        # replace each other's partitions of a dataset. 
+        results.to_pickle(os.path.join(savepath or ".", _shard_path(str(date.today()) + ".pkl", shard)))
+    elif args.format == 'parquet': 
+        write_dataset(results, os.path.join(savepath or ".", "silph_factions"))
+    elif savepath: 
         results.to_pickle(savepath+ "/" + str(date.today()) + ".pkl")
     else: 
         results.to_pickle(str(date.today()) +".pkl")
@@ -0,0 +1,121 @@
+# Durable progress journal so an interrupted scrape can resume where it stopped
+import os
+import json
+import time
+import threading
+
+class ScrapeJournal:
+    """
+    Append-only journal of the progress of a scrape, kept as one JSON entry per line. It records each roster page
+    that has been scraped with its factions and members, and each player that has been scraped with their rows.
+    Every entry is flushed and synced to disk as soon as it is written, so after a crash the journal holds
+    everything completed before it. A partially written last line is ignored when the journal is read back.
+
+    Opening a journal resumes it when it belongs to the same run (same run dict), is unfinished, and was started
+    less than max_age seconds ago. Otherwise the old journal is replaced by a new one.
+
+    Arguments:
+    - path:
+        path string for the journal file.
+    - run:
+        dict identifying the scrape, e.g. its url_base, tiers and regions. Must be JSON serializable.
+    - max_age:
+        (Optional) time in seconds after which an unfinished journal is no longer resumed. Defaults to no limit.
+    - resume:
+        bool for whether to resume an unfinished journal. Default is True. If False, a new journal is always started.
+    """
+    def __init__(self, path, run, max_age = None, resume = True):
+        self.path = path
+        self.run = json.loads(json.dumps(run))
+        self.rosters = {}
+        self.players = {}
+        self.completed = False
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+        if not (resume and self._load(max_age)):
+            self.rosters, self.players, self.completed = {}, {}, False
+            self.started = time.time()
+            self._rewrite([{"type": "run", "run": self.run, "started": self.started}])
+
+    def _load(self, max_age):
+        """
+        Helper function to read back an existing journal. Returns whether it can be resumed.
+        """
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            lines = f.read().splitlines()
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break # Only the last line can be partial, since each entry is synced before the next is written
+        if not entries or entries[0].get("type") != "run" or entries[0].get("run") != self.run:
+            return False
+        self.started = entries[0]["started"]
+        if max_age is not None and self.started + max_age < time.time():
+            return False
+        for entry in entries[1:]:
+            if entry["type"] == "roster":
+                self.rosters[(entry["tier"], entry["region"])] = entry["rosters"]
+            elif entry["type"] == "player":
+                self.players[entry["player"]] = entry["rows"]
+            elif entry["type"] == "complete":
+                self.completed = True
+        if self.completed:
+            return False
+        # Rewrite the journal without any partial last line before appending to it.
+        if len(entries) < len(lines):
+            self._rewrite(entries)
+        return True
+
+    def _rewrite(self, entries):
+        """
+        Helper function to replace the journal with entries. They are written and synced to a temporary file
+        first, so a crash during the rewrite leaves either the old or the new journal, never a truncated one.
+        """
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, "w") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def _append(self, entry):
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def record_roster(self, tier, region, rosters):
+        """
+        Function to record the faction rosters scraped for a tier and region.
+        """
+        self.rosters[(tier, region)] = rosters
+        self._append({"type": "roster", "tier": tier, "region": region, "rosters": rosters})
+
+    def record_player(self, player, rows):
+        """
+        Function to record the rows scraped for a player.
+        """
+        self.players[player] = rows
+        self._append({"type": "player", "player": player, "row_count": len(rows), "rows": rows})
+
+    def complete(self):
+        """
+        Function to mark the scrape as finished, so the journal is not resumed by the next run.
+        """
+        self.completed = True
+        self._append({"type": "complete", "finished": time.time()})
+
+    def summary(self):
+        """
+        Function to summarize the progress recorded so far.
+        Returns:
+            a dict of {str: int} with the number of roster pages, players and rows recorded
+        """
+        return {"rosters": len(self.rosters), "players": len(self.players),
+                "rows": sum(len(rows) for rows in self.players.values())}
@@ -0,0 +1,377 @@
+# Long-running lookup server answering player and faction queries from memory, for match prep
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import OrderedDict, Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, quote, unquote, urlencode
+from urllib.request import urlopen
+from urllib.error import HTTPError, URLError
+
+# pandas, bs4 and the scraper are only imported by PlayerLookup, i.e. by the server or by a lookup made without
+# a server running, so that a lookup answered by the server starts in a fraction of the time.
+
+# Global variables for the server and its caches.
+lookup_host = "127.0.0.1"
+lookup_port = 8765
+lookup_cache_size = 512 # Answers and Silph Cards kept in memory, least recently used first out
+lookup_card_ttl = 5*60 # A refresh only refetches a Silph Card read more than this many seconds ago
+default_team_count = 5
+default_mon_count = 10
+
+class LRUCache:
+    """
+    Thread-safe mapping that holds at most maxsize entries, dropping the least recently used first.
+    Arguments:
+    - maxsize:
+        int of the maximum number of entries.
+    """
+    def __init__(self, maxsize = lookup_cache_size):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Function to look up an entry, marking it as the most recently used.
+        Returns:
+        - (found, value):
+            bool for whether the entry exists, and its value (None if not found)
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return True, self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+class PlayerLookup:
+    """
+    In-memory index over a results dataset that answers player and faction queries (latest teams and most
+    brought Pokemon) without scanning the dataset. Rows are sorted from the latest bout down and grouped by
+    player and faction once when the dataset is loaded, so each query only touches the rows it returns.
+    Silph Cards fetched for players missing from the dataset, or refreshed on request, and the answers
+    themselves are kept in an LRUCache.
+
+        lookup = PlayerLookup("silph_factions")
+        lookup.player("SageShadows", teams=5)
+
+    Arguments:
+    - dataset:
+        (Optional) path string of a results pickle or of a Parquet dataset written by write_dataset(). Without
+        one, player queries are answered from Silph Cards alone and faction queries are unavailable.
+    - url_base:
+        (Optional) URL that points to the Silph Season and Cycle of the Silph Cards, as in full_scrape().
+    - cache_size:
+        int of the number of answers and Silph Cards kept in memory. Default is lookup_cache_size.
+    """
+    def __init__(self, dataset = None, url_base = None, cache_size = lookup_cache_size):
+        import silph_factions_scraper as sf
+        from silph_query import mon_categories
+        self.sf = sf
+        self.mon_categories = mon_categories
+        self.url_base = url_base or sf.factions_url_base
+        self.cache = LRUCache(cache_size)
+        self.cards = LRUCache(cache_size)
+        self.load(dataset)
+
+    def load(self, dataset = None):
+        """
+        Function to (re)load the dataset, e.g. after the weekly scrape, and drop every cached answer.
+        """
+        pd = self.sf.pd
+        self.dataset = dataset
+        self.loaded = time.time()
+        if dataset is None:
+            results = pd.DataFrame(columns=self.sf.results_categories)
+        elif dataset.endswith(".pkl"):
+            results = pd.read_pickle(dataset)
+        else:
+            results = self.sf.load_dataset(dataset)
+        self.results = results.sort_values(["season", "cycle", "bout"], ascending=False, kind="stable").reset_index(drop=True)
+        self._players = self._group_positions("player")
+        self._factions = self._group_positions("faction")
+        self.cache.clear()
+        self.cards.clear()
+
+    def _group_positions(self, column):
+        """
+        Helper function to map each lowercased value of a column onto the positions of its rows, in row order.
+        """
+        if not len(self.results):
+            return {}
+        return self.results.groupby(self.results[column].astype(str).str.lower(), sort=False).indices
+
+    def _card_rows(self, player, refresh = False):
+        """
+        Helper function to get the rows of a player's Silph Card from memory. A refresh refetches the card,
+        bypassing the scrape cache, once the card in memory is older than lookup_card_ttl.
+        """
+        found, card = self.cards.get(player.lower())
+        if found and not (refresh and time.time() - card[0] > lookup_card_ttl):
+            return card[1]
+        if refresh:
+            self.sf.cache_store.delete("card", self.sf._card_cache_key(player, self.url_base))
+        rows = self.sf._scrape_member(player, self.url_base)
+        self.cards.set(player.lower(), (time.time(), rows))
+        return rows
+
+    def _summary(self, teams, team_count, mon_count):
+        """
+        Helper function to format the latest teams and the most brought Pokemon of a set of rows.
+        """
+        mons = Counter(mon for mon in teams[self.mon_categories].to_numpy().ravel() if isinstance(mon, str) and mon != "N/A")
+        return {"team_count": len(teams),
+                "teams": json.loads(teams.head(team_count).to_json(orient="records")),
+                "most_brought": mons.most_common(mon_count)}
+
+    def player(self, name, teams = default_team_count, mons = default_mon_count, refresh = False):
+        """
+        Function to answer a player query. Players missing from the dataset are looked up on their Silph Card.
+        Arguments:
+        - name:
+            str of the player's username, in any case.
+        - teams:
+            int of the number of latest teams to return. Default is default_team_count.
+        - mons:
+            int of the number of most brought Pokemon to return. Default is default_mon_count.
+        - refresh:
+            bool for whether to also read the player's Silph Card, for bouts played since the dataset was scraped.
+            The card is refetched if it was last read more than lookup_card_ttl ago. Default is False.
+        Returns:
+            a JSON serializable dict with the player, its source ("dataset", "card" or "dataset+card"), team_count,
+            the latest teams in results_categories format and most_brought as [Pokemon, count] pairs, or None if
+            the player has no results
+        """
+        key = ("player", name.lower(), teams, mons)
+        found, answer = self.cache.get(key) if not refresh else (False, None)
+        if found:
+            return answer
+        positions = self._players.get(name.lower())
+        player_results = self.results.iloc[positions] if positions is not None else None
+        source = "dataset"
+        if refresh or player_results is None:
+            card_results = self.sf.build_results(self._card_rows(name, refresh))
+            if player_results is None:
+                player_results, source = card_results, "card"
+            else:
+                player_results, source = self.sf.merge_results(player_results, card_results), "dataset+card"
+            player_results = player_results.sort_values(["season", "cycle", "bout"], ascending=False, kind="stable")
+        answer = None
+        if len(player_results):
+            answer = {"player": name, "source": source, **self._summary(player_results, teams, mons)}
+        self.cache.set(key, answer)
+        return answer
+
+    def faction(self, name, teams = default_team_count, mons = default_mon_count):
+        """
+        Function to answer a faction query from the dataset. Takes the same arguments as player(), except refresh.
+        Returns:
+            a JSON serializable dict with the faction, its members, team_count, the latest teams and most_brought,
+            or None if the faction has no results
+        """
+        key = ("faction", name.lower(), teams, mons)
+        found, answer = self.cache.get(key)
+        if found:
+            return answer
+        positions = self._factions.get(name.lower())
+        answer = None
+        if positions is not None:
+            faction_results = self.results.iloc[positions]
+            answer = {"faction": name, "members": sorted(faction_results["player"].astype(str).unique()),
+                      **self._summary(faction_results, teams, mons)}
+        self.cache.set(key, answer)
+        return answer
+
+    def stats(self):
+        return {"dataset": self.dataset, "rows": len(self.results), "players": len(self._players), "factions": len(self._factions),
+                "loaded": self.loaded, "answers": self.cache.stats(), "cards": self.cards.stats()}
+
+class LookupServer:
+    """
+    Local HTTP server answering queries from a PlayerLookup with JSON:
+        GET /player/<name>?teams=5&mons=10&refresh=1
+        GET /faction/<name>?teams=5&mons=10
+        GET /stats
+        POST /reload
+    Unknown players and factions are answered with a 404. Can be used as a context manager, like MockSilphServer.
+    Arguments:
+    - lookup:
+        PlayerLookup to answer queries with.
+    - host:
+        str of the address to listen on. Default is lookup_host, which only accepts local connections.
+    - port:
+        int for the port to listen on. Default is lookup_port. 0 picks a free port.
+    """
+    def __init__(self, lookup, host = lookup_host, port = lookup_port):
+        self.lookup = lookup
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, status, body):
+                content = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def do_GET(self):
+                start_time = time.perf_counter()
+                url = urlparse(self.path)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                parts = [unquote(part) for part in url.path.strip("/").split("/", 1)]
+                try:
+                    if parts == ["stats"]:
+                        return self._respond(200, server.lookup.stats())
+                    if len(parts) != 2 or parts[0] not in ("player", "faction"):
+                        return self._respond(404, {"error": f"Unknown path {url.path}. Please use /player/<name> or /faction/<name>."})
+                    arguments = {"teams": int(query.get("teams", default_team_count)), "mons": int(query.get("mons", default_mon_count))}
+                    if parts[0] == "player":
+                        answer = server.lookup.player(parts[1], refresh=query.get("refresh", "0") not in ("0", "false", ""), **arguments)
+                    else:
+                        answer = server.lookup.faction(parts[1], **arguments)
+                except Exception as e:
+                    return self._respond(500, {"error": f"{type(e).__name__}: {e}"})
+                if answer is None:
+                    return self._respond(404, {"error": f"No results for {parts[0]} {parts[1]}."})
+                self._respond(200, {**answer, "elapsed_ms": (time.perf_counter() - start_time) * 1000})
+
+            def do_POST(self):
+                if urlparse(self.path).path.strip("/") != "reload":
+                    return self._respond(404, {"error": f"Unknown path {self.path}. Please use /reload."})
+                server.lookup.load(server.lookup.dataset)
+                self._respond(200, server.lookup.stats())
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def lookup(kind, name, teams = default_team_count, mons = default_mon_count, refresh = False,
+           url = f"http://{lookup_host}:{lookup_port}", dataset = None, timeout = 60):
+    """
+    Function to answer a player or faction query through a running LookupServer. If no server is running, the
+    query is answered in this process instead, which has to import the scraper and load the dataset first.
+    Arguments:
+    - kind:
+        str, either "player" or "faction".
+    - name:
+        str of the username or faction name.
+    - teams, mons, refresh:
+        same as in PlayerLookup.player()
+    - url:
+        str of the URL of the server. Default is the lookup_host and lookup_port.
+    - dataset:
+        (Optional) path string of the dataset to load when no server is running.
+    - timeout:
+        time in seconds to wait for the server, which may have to fetch a Silph Card. Default is 60 seconds.
+    Returns:
+        the answer as a dict, or None if there are no results
+    """
+    query = {"teams": teams, "mons": mons, **({"refresh": 1} if refresh else {})}
+    try:
+        with urlopen(f"{url}/{kind}/{quote(name, safe='')}?{urlencode(query)}", timeout=timeout) as response:
+            return json.loads(response.read())
+    except HTTPError as e:
+        if e.code == 404:
+            return None
+        raise Exception(json.loads(e.read()).get("error", str(e)))
+    except URLError:
+        pass
+    player_lookup = PlayerLookup(dataset)
+    if kind == "player":
+        return player_lookup.player(name, teams, mons, refresh)
+    return player_lookup.faction(name, teams, mons)
+
+def format_answer(answer):
+    """
+    Function to format an answer from lookup() for the terminal.
+    """
+    lines = [f"{answer.get('player') or answer.get('faction')}: {answer['team_count']} teams"
+             + (f" from {answer['source']}" if "source" in answer else "")]
+    if "members" in answer:
+        lines.append("Members: " + ", ".join(answer["members"]))
+    for team in answer["teams"]:
+        mons = ", ".join(team[mon] for mon in ("mon1", "mon2", "mon3", "mon4", "mon5", "mon6") if team[mon] not in (None, "N/A"))
+        lines.append(f"  S{team['season']} C{team['cycle']} B{team['bout']} {team['format']} {team['record']} "
+                     + ("" if "player" in answer else f"{team['player']} ") + f"| {mons}")
+    lines.append("Most brought: " + ", ".join(f"{mon} ({count})" for mon, count in answer["most_brought"]))
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='Silph Lookup',
+                    description='Answers player and faction queries from a long-running local server')
+    parser.add_argument('--port', help="Port of the lookup server", type=int, default=lookup_port)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help="Run the lookup server until interrupted.")
+    serve_parser.add_argument('--dataset', help="Results pickle or Parquet dataset to serve, e.g. silph_factions")
+    serve_parser.add_argument('--url_base', help="Season and cycle URL of the Silph Cards, as in full_scrape()")
+    serve_parser.add_argument('--cache_size', help="Number of answers and Silph Cards kept in memory", type=int, default=lookup_cache_size)
+    for kind in ("player", "faction"):
+        kind_parser = subparsers.add_parser(kind, help=f"Look up a {kind}'s latest teams and most brought Pokemon.")
+        kind_parser.add_argument('name', help=f"Name of the {kind}")
+        kind_parser.add_argument('--teams', help="Number of latest teams to show", type=int, default=default_team_count)
+        kind_parser.add_argument('--mons', help="Number of most brought Pokemon to show", type=int, default=default_mon_count)
+        kind_parser.add_argument('--dataset', help="Dataset to load if no server is running")
+        kind_parser.add_argument('--json', help="Print the answer as JSON", action='store_true')
+        if kind == "player":
+            kind_parser.add_argument('--refresh', help="Also read the player's Silph Card for the latest bouts", action='store_true')
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        server = LookupServer(PlayerLookup(args.dataset, args.url_base, args.cache_size), port=args.port)
+        print(f"Serving lookups on {server.url}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+    else:
+        answer = lookup(args.command, args.name, args.teams, args.mons, getattr(args, "refresh", False),
+                        url=f"http://{lookup_host}:{args.port}", dataset=args.dataset)
+        if answer is None:
+            print(f"No results for {args.command} {args.name}.")
+            sys.exit(1)
+        print(json.dumps(answer, indent=4) if args.json else format_answer(answer))
@@ -0,0 +1,211 @@
+# Metrics for the scrape: counters and histograms, exported as a JSON summary and a Prometheus textfile
+import os
+import json
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+# Default histogram buckets, as upper bounds. Requests and parses are in seconds.
+latency_buckets = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+parse_buckets = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1]
+rows_buckets = [0, 1, 2, 5, 10, 20, 50, 100, 200]
+
+class Histogram:
+    """
+    Histogram of observed values with fixed bucket upper bounds, as in Prometheus.
+    Arguments:
+    - buckets:
+        list of floats of the upper bound of each bucket, in increasing order.
+    """
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """
+        Function to estimate a quantile as the upper bound of the bucket it falls in, capped at the largest observation.
+        Returns:
+            float of the estimate, the largest observation if it falls past the last bucket, or None if empty
+        """
+        if not self.count:
+            return None
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= q * self.count:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "sum": self.sum, "mean": self.sum / self.count if self.count else None,
+                "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99), "max": self.max,
+                "buckets": {str(bound): count for bound, count in zip(self.buckets + ["+Inf"], self.counts)}}
+
+class ScrapeMetrics:
+    """
+    Thread-safe collection of labelled counters and histograms for a scrape, e.g.
+
+        metrics.inc("bytes_downloaded", len(page.content), page="card")
+        with metrics.timer("request_seconds", page="card"):
+            ...
+
+    Arguments:
+    - prefix:
+        str prepended to every metric name in the Prometheus textfile. Default is "silph_scraper_".
+    """
+    def __init__(self, prefix = "silph_scraper_"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Function to drop every metric, e.g. at the start of a new scrape.
+        """
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.started = time.time()
+
+    def inc(self, name, value = 1, **labels):
+        """
+        Function to add value to the counter name with the given labels.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        Function to set the counter name with the given labels to value, e.g. for totals read from elsewhere.
+        """
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, buckets = latency_buckets, **labels):
+        """
+        Function to record value in the histogram name with the given labels. buckets is only used the first
+        time the histogram is observed.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, buckets = latency_buckets, **labels):
+        """
+        Context manager to record the time spent in its block, in seconds, in the histogram name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, buckets, **labels)
+
+    def counter(self, name, **labels):
+        """
+        Function to read a counter.
+        Returns:
+            the value of the counter name with the given labels, or 0 if it was never incremented
+        """
+        with self._lock:
+            return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def summary(self):
+        """
+        Function to summarize every metric.
+        Returns:
+            a JSON serializable dict with the start time and duration of the run, and each counter and histogram
+            keyed by name, then by labels formatted as "label=value,..." ("" for no labels)
+        """
+        with self._lock:
+            summary = {"started": self.started, "duration_seconds": time.time() - self.started, "counters": {}, "histograms": {}}
+            for (name, labels), value in sorted(self.counters.items()):
+                summary["counters"].setdefault(name, {})[",".join(f"{label}={value}" for label, value in labels)] = value
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                summary["histograms"].setdefault(name, {})[",".join(f"{label}={value}" for label, value in labels)] = histogram.summary()
+        return summary
+
+    def prometheus(self):
+        """
+        Function to format every metric in the Prometheus text exposition format.
+        Returns:
+            str of the metrics, one sample per line
+        """
+        def format_labels(labels):
+            if not labels:
+                return ""
+            escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+            return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + "}"
+
+        lines = []
+        with self._lock:
+            lines += [f"# TYPE {self.prefix}run_duration_seconds gauge", f"{self.prefix}run_duration_seconds {time.time() - self.started}"]
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE {self.prefix}{name}_total counter")
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append(f"{self.prefix}{name}_total{format_labels(labels)} {value}")
+            names = sorted({name for name, _ in self.histograms})
+            for name in names:
+                lines.append(f"# TYPE {self.prefix}{name} histogram")
+                for (histogram_name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"{self.prefix}{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{self.prefix}{name}_sum{format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{self.prefix}{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, summary_path = None, textfile_path = None):
+        """
+        Function to write the JSON summary and/or the Prometheus textfile. Each file is written to a temporary
+        file first and then renamed, so a textfile collector never reads a partial file.
+        Arguments:
+        - summary_path:
+            (Optional) path string for the JSON summary.
+        - textfile_path:
+            (Optional) path string for the Prometheus textfile, which should end in ".prom".
+        """
+        for path, content in ((summary_path, lambda: json.dumps(self.summary(), indent=2)), (textfile_path, self.prometheus)):
+            if path is None:
+                continue
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                f.write(content())
+            os.replace(temp_path, path)
+
+@contextmanager
+def profile(path = None):
+    """
+    Context manager to run its block under cProfile and dump the stats to path, to be read with pstats or
+    snakeviz. Only the calling thread is profiled, so profile with max_workers = 1 to include the scraping
+    itself. Does nothing if path is None.
+    """
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,230 @@
+# Local mirror of Silph pages for offline scrapes and timing runs
+import os
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import quote, unquote, urlparse
+
+import silph_factions_scraper as sf
+
+# Global variable for the default fixture directory.
+fixture_cache = "__fixtures__"
+
+def fixture_path(fixture_dir, url_path):
+    """
+    Helper function to map the path of a URL onto its recorded file in the fixture directory.
+    Arguments:
+    - fixture_dir:
+        path string for the fixture directory.
+    - url_path:
+        str of the path portion of a URL, e.g. "/factions/cycle/season-2-cycle-4-Gold-NA"
+    Returns:
+        path string of the recorded HTML file
+    """
+    return os.path.join(fixture_dir, quote(unquote(url_path).strip("/"), safe="") + ".html")
+
+def record_fixtures(urls, fixture_dir = fixture_cache):
+    """
+    Function to save the raw HTML of live Silph pages so they can be served locally.
+    Arguments:
+    - urls:
+        list of strs of the URLs to record, e.g. [sf.card_url_base + "SageShadows"]
+    - fixture_dir:
+        path string for the fixture directory. Default is "__fixtures__"
+    Returns:
+    - recorded:
+        list of path strings of the recorded files
+    """
+    sf._setup_cache(fixture_dir)
+    recorded = []
+    for url in urls:
+        page = sf.fetch_page(url)
+        if page.status_code != 200:
+            print(f"Skipping {url}, status code {page.status_code}")
+            continue
+        path = fixture_path(fixture_dir, urlparse(url).path)
+        with open(path, "wb") as f:
+            f.write(page.content)
+        recorded.append(path)
+    return recorded
+
+def record_corpus(tiers, regions, url_base = sf.factions_url_base, cards_per_faction = 3, fixture_dir = fixture_cache):
+    """
+    Function to record a small corpus of live pages for a scrape: the tier and region pages, every faction page
+    listed on them, and the Silph Cards of the first few members of each faction. Serving the corpus with
+    MockSilphServer reproduces a full_scrape() of those tiers and regions with the recorded cards.
+    Arguments:
+    - tiers, regions:
+        lists of strs of the tiers and regions to record, as in full_scrape().
+    - url_base:
+        URL that points to the Silph Season and Cycle, as in full_scrape().
+    - cards_per_faction:
+        (Optional) int for the number of members of each faction whose Silph Cards are recorded. None records
+        every member. Default is 3.
+    - fixture_dir:
+        path string for the fixture directory. Default is "__fixtures__"
+    Returns:
+    - recorded:
+        list of path strings of the recorded files
+    """
+    def read(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    tier_pages = record_fixtures([url_base + tier + "-" + region for tier in tiers for region in regions], fixture_dir)
+    faction_urls = [faction_url for path in tier_pages for _, faction_url in sf.parse_tier_region_page(read(path))]
+    faction_pages = record_fixtures(list(dict.fromkeys(faction_urls)), fixture_dir)
+    usernames = [member for path in faction_pages for member in sf.parse_faction_page(read(path))[:cards_per_faction]]
+    cards = record_fixtures([sf.card_url_base + quote(username) for username in dict.fromkeys(usernames)], fixture_dir)
+    return tier_pages + faction_pages + cards
+
+class MockSilphServer:
+    """
+    Local HTTP server that serves recorded Silph pages from a fixture directory. A request for any
+    path is answered with the file recorded for that path, or a 404 if none exists. Can be used
+    as a context manager:
+
+        with MockSilphServer("__fixtures__", latency=0.2) as server:
+            sf.card_url_base = server.url + "/"
+
+    Arguments:
+    - fixture_dir:
+        path string for the fixture directory.
+    - latency:
+        time in float amount of seconds to wait before answering each request, to simulate
+        the round-trip to silph.gg. Default is 0.
+    - port:
+        int for the port to listen on. Default is 0, which picks a free port.
+    - error_rate:
+        float between 0 and 1 of the share of requests answered with error_status instead of the page, to
+        simulate a throttling or overloaded site. Default is 0.
+    - error_status:
+        int of the HTTP status of injected errors. Default is 503.
+    - retry_after:
+        (Optional) int or float of the seconds sent in the Retry-After header of injected errors.
+    - seed:
+        (Optional) int seeding which requests get injected errors, for repeatable runs.
+    """
+    def __init__(self, fixture_dir = fixture_cache, latency = 0, port = 0, error_rate = 0, error_status = 503, retry_after = None, seed = None):
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.requests_served = 0
+        self.errors_served = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(server.latency)
+                with server._lock:
+                    server.requests_served += 1
+                    inject_error = server._random.random() < server.error_rate
+                    server.errors_served += inject_error
+                if inject_error:
+                    self.send_response(server.error_status)
+                    if server.retry_after is not None:
+                        self.send_header("Retry-After", str(server.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                path = fixture_path(server.fixture_dir, urlparse(self.path).path)
+                if not os.path.exists(path):
+                    self.send_error(404)
+                    return
+                with open(path, "rb") as f:
+                    body = f.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def recorded_usernames(fixture_dir = fixture_cache):
+    """
+    Helper function to list the usernames of all Silph Cards recorded in the fixture directory.
+    Card pages live at the root of sil.ph, so any recorded path without a "/" is a username.
+    """
+    usernames = []
+    for filename in sorted(os.listdir(fixture_dir)):
+        path = unquote(filename[:-len(".html")])
+        if filename.endswith(".html") and "/" not in path:
+            usernames.append(path)
+    return usernames
+
+def time_card_scrape(usernames, max_workers = 1, fixture_dir = fixture_cache, latency = 0):
+    """
+    Function to time fetching and parsing Silph Cards from a local server. The player cache is
+    bypassed so every card is requested.
+    Arguments:
+    - usernames:
+        list of strs of recorded usernames.
+    - max_workers:
+        int for the number of Silph Cards requested at once. Default is 1.
+    - fixture_dir:
+        path string for the fixture directory.
+    - latency:
+        time in float amount of seconds the server waits before each response.
+    Returns:
+    - (elapsed, results):
+        elapsed time in seconds and the pd.DataFrame of all parsed results, in username order
+    """
+    with MockSilphServer(fixture_dir, latency) as server:
+        scrape = lambda username: sf.parse_silph_card(sf.fetch_page(server.url + "/" + quote(username)).content, username)
+        start_time = time.time()
+        member_scrapes = sf._map_concurrent(scrape, usernames, max_workers)
+        elapsed = time.time() - start_time
+    return elapsed, sf.pd.concat([sf.pd.DataFrame(columns=sf.results_categories)] + member_scrapes)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+                    prog='Silph Mock Server',
+                    description='Records Silph pages and times scrapes against a local copy of them')
+    parser.add_argument('--fixture_dir', help="Directory of recorded pages", default=fixture_cache)
+    parser.add_argument('--record', help="Usernames whose Silph Cards should be recorded, or URLs of any other pages to record", nargs='*')
+    parser.add_argument('--record_rosters', help="Tier and region pages to record with their faction pages, given as Tier-Region, e.g. Gold-NA", nargs='*')
+    parser.add_argument('--url_base', help="URL of the Silph Season and Cycle for --record_rosters", default=sf.factions_url_base)
+    parser.add_argument('--cards_per_faction', help="Members of each faction whose Silph Cards are recorded with --record_rosters", type=int, default=3)
+    parser.add_argument('--max_workers', help="Number of Silph Cards to request at once.", type=int, default=8)
+    parser.add_argument('--latency', help="Seconds of simulated latency per request", type=float, default=0.2)
+
+    args = parser.parse_args()
+    if args.record:
+        record_fixtures([page if page.startswith("http") else sf.card_url_base + quote(page) for page in args.record], args.fixture_dir)
+    for tier_region in args.record_rosters or []:
+        tier, region = tier_region.split("-")
+        record_corpus([tier], [region], args.url_base, args.cards_per_faction, args.fixture_dir)
+
+    usernames = recorded_usernames(args.fixture_dir)
+    sequential_time, sequential_results = time_card_scrape(usernames, 1, args.fixture_dir, args.latency)
+    concurrent_time, concurrent_results = time_card_scrape(usernames, args.max_workers, args.fixture_dir, args.latency)
+    print(f"{len(usernames)} cards: {sequential_time:.2f}s sequential, {concurrent_time:.2f}s with {args.max_workers} workers "
+          f"({sequential_time / concurrent_time:.1f}x). Identical results: {sequential_results.equals(concurrent_results)}")
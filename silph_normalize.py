@@ -0,0 +1,145 @@
+# Normalization of Pokemon names and bout information scraped from Silph Cards
+import re
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Tables driving the normalization. Each is checked in order and the first match wins, so that the
+# results match those of earlier scrapes.
+# Titles that are renamed outright.
+pokemon_name_overrides = {"Armored Mewtwo": "Mewtwo-Armor"}
+# Regional prefixes, e.g. "Alolan Ninetales" becomes "Ninetales-Alola".
+regional_forms = {"Alolan": "Alola", "Galarian": "Galar", "Hisuian": "Hisui"}
+# Words marking an alternate forme, e.g. "Giratina (Origin Forme)" becomes "Giratina-Origin".
+forme_keywords = ["Forme", "Cloak", "Size"]
+# Castform is named after its weather, except for its normal form.
+castform_forms = {"Snowy": "Castform-Snowy", "Rainy": "Castform-Rainy", "Sunny": "Castform-Sunny", "Normal": "Castform"}
+shadow_suffix = "-S"
+
+# Factions events that are not regular bouts.
+excluded_events = ("Global Melee", "World Championship", "Torneo")
+cup_types = ["Great", "Ultra", "Master"]
+region_aliases = {"": "Not Available", "EU": "EMEA"}
+tier_aliases = {"": "Not Available"}
+
+# Precompiled patterns for bout URLs and titles.
+forme_split_pattern = re.compile("\\s\\(*")
+qualifier_patterns = [(re.compile("https://silph.gg/factions/cycle/may-2021-qualifiers-(.*)"), 0, 1),
+                      (re.compile("https://silph.gg/factions/cycle/preseason-cycle-2-qualifiers-(.*)"), 0, 2)]
+season_pattern = re.compile("https://silph.gg/factions/cycle/season-(.*)-cycle-(.*)-(.*)-(.*)")
+bout_title_pattern = re.compile("Bout (.*): (.*)")
+
+@lru_cache(maxsize=4096)
+def normalize_pokemon_title(title):
+    """
+    Function to standardize the title of a Pokemon on a Silph Card, not counting whether it is shadow:
+        (Base Name)-(Forme/Region/Size/Cloak)*
+    Results are memoized, since only a few hundred distinct titles exist.
+    Arguments:
+    - title:
+        str of the "title" attribute of the Pokemon on the Silph Card, e.g. "Giratina (Origin Forme)"
+    Returns:
+        the standardized name as a str, e.g. "Giratina-Origin"
+    """
+    if title in pokemon_name_overrides:
+        return pokemon_name_overrides[title]
+    for prefix, region in regional_forms.items():
+        if prefix in title:
+            return title.replace(prefix + " ", "") + "-" + region
+    if any(keyword in title for keyword in forme_keywords):
+        result = forme_split_pattern.split(title)
+        return result[0] + "-" + result[1]
+    if "Castform" in title:
+        return next((name for form, name in castform_forms.items() if form in title), title)
+    return title
+
+def normalize_pokemon_name(name):
+    """
+    Function to standardize a Pokemon name that may already carry the shadow suffix, e.g. one from the results
+    of an earlier scrape. Standardized names are left unchanged.
+    """
+    if name.endswith(shadow_suffix):
+        return normalize_pokemon_title(name[:-len(shadow_suffix)]) + shadow_suffix
+    return normalize_pokemon_title(name)
+
+@lru_cache(maxsize=4096)
+def parse_bout_url(bout_url):
+    """
+    Function to read the season, cycle, tier and region of a bout from its URL. Results are memoized, since
+    every player in a tier and region shares the same bout URLs.
+    Arguments:
+    - bout_url:
+        str of the URL of the bout, e.g. "https://silph.gg/factions/cycle/season-2-cycle-4-gold-na"
+    Returns:
+        (season: int, cycle: int, tier: str, region: str), with -1 and "Not Available" for anything missing
+    """
+    region, season, cycle, tier = "", -1, -1, ""
+    for pattern, qualifier_season, qualifier_cycle in qualifier_patterns:
+        parsed_url = pattern.search(bout_url)
+        if parsed_url:
+            region, season, cycle, tier = parsed_url[1].upper(), qualifier_season, qualifier_cycle, "Qualifiers"
+            break
+    else:
+        if "season-" in bout_url:
+            parsed_url = season_pattern.search(bout_url)
+            season, cycle, tier, region = parsed_url[1], parsed_url[2], parsed_url[3].title(), parsed_url[4].upper()
+    return int(season), int(cycle), tier_aliases.get(tier, tier), region_aliases.get(region, region)
+
+@lru_cache(maxsize=1024)
+def parse_bout_title(bout_title):
+    """
+    Function to read the bout number from the title of a bout, e.g. "Bout 3: ...". Promotion/relegation
+    battles count as bout 8.
+    Returns:
+        int of the bout number
+    """
+    parsed_title = bout_title_pattern.search(bout_title)
+    if parsed_title[2] == "Promotions/Relegations":
+        return 8
+    return int(parsed_title[1])
+
+@lru_cache(maxsize=64)
+def normalize_cup_type(cup_type):
+    """
+    Function to standardize the cup type of a bout, e.g. "★ Great League ★" becomes "Great".
+    """
+    cup_type = cup_type.strip().strip("★").strip()
+    return next((name for name in cup_types if name in cup_type), cup_type)
+
+def is_excluded_event(arena_badge):
+    """
+    Function to check whether the arena badge of an event marks it as something other than a regular bout.
+    """
+    return any(event in arena_badge for event in excluded_events)
+
+def _map_unique(column, func):
+    """
+    Helper function to apply func once to each unique value of a column, keeping missing values and categoricals.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, uniques = column.cat.codes.to_numpy(), column.cat.categories
+    else:
+        codes, uniques = pd.factorize(np.asarray(column, dtype=object))
+    mapped = np.array([func(value) for value in uniques] + [np.nan], dtype=object)
+    mapped_column = pd.Series(mapped[codes], index=column.index, name=column.name)
+    return mapped_column.astype("category") if isinstance(column.dtype, pd.CategoricalDtype) else mapped_column
+
+def renormalize_results(results, mon_columns = ("mon1", "mon2", "mon3", "mon4", "mon5", "mon6")):
+    """
+    Function to apply the current normalization to results from an earlier scrape, e.g. a pickle scraped before
+    a regional form was added to regional_forms. Each distinct name is normalized once, so a full history is
+    renormalized in a single vectorized pass per column.
+    Arguments:
+    - results:
+        a pd.DataFrame obtained by running full_scrape()
+    - mon_columns:
+        iterable of strs of the Pokemon columns. Default is the six Pokemon columns.
+    Returns:
+        a copy of results with the Pokemon names, regions and tiers standardized
+    """
+    results = results.copy()
+    for column in mon_columns:
+        results[column] = _map_unique(results[column], lambda name: normalize_pokemon_name(name) if isinstance(name, str) else name)
+    results["region"] = _map_unique(results["region"], lambda region: region_aliases.get(region, region))
+    results["tier"] = _map_unique(results["tier"], lambda tier: tier_aliases.get(tier, tier))
+    return results
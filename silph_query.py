@@ -0,0 +1,182 @@
+# Indexed, vectorized lookups over scraped results
+import math
+import numpy as np
+import pandas as pd
+
+mon_categories = ["mon1", "mon2", "mon3", "mon4", "mon5", "mon6"]
+index_categories = ["season", "cycle", "bout", "region", "tier", "faction", "player", "format"]
+
+class ResultsIndex:
+    """
+    Index over a results DataFrame that answers filter lists and Pokemon lookups without scanning the
+    DataFrame once per filter. Each column is factorized into integer codes the first time it is queried,
+    and the six Pokemon columns share an inverted index from Pokemon to the rows that brought it.
+    Build one index and reuse it for repeated queries against the same results:
+
+        index = ResultsIndex(results)
+        sf.subset_results(index, filter_list)
+
+    Arguments:
+    - results:
+        a pd.DataFrame obtained by running full_scrape(). It should not be modified while the index is in use.
+    - columns:
+        list of strs of columns to factorize up front. Default is index_categories. Other columns are
+        factorized the first time they are queried.
+    """
+    def __init__(self, results, columns = index_categories):
+        self.results = results
+        self._codes = {}
+        self._mon_index = None
+        for column in columns:
+            self._column_codes(column)
+
+    def _column_codes(self, column):
+        """
+        Helper function to get the factorized (codes, uniques) of a column, building them on first use.
+        """
+        if column not in self._codes:
+            self._codes[column] = pd.factorize(np.asarray(self.results[column], dtype=object))
+        return self._codes[column]
+
+    def _value_codes(self, column, values):
+        """
+        Helper function to map filter values onto the codes of a column. Values not in the column map to -1.
+        """
+        uniques = self._column_codes(column)[1]
+        return pd.Index(uniques).get_indexer(pd.Index(list(values), dtype=object))
+
+    def positions(self, filter_list):
+        """
+        Function to find the rows matched by each filter in a filter list.
+        Arguments:
+        - filter_list:
+            list of dictionaries with filters in {filter: value} format, e.g. from enumerate_bouts() and add_filter().
+        Returns:
+            np.ndarray of row positions, grouped by filter in filter_list order and in results order within each
+            filter. A row matched by several filters appears once for each of them.
+        """
+        # Filters sharing the same keys are resolved together with a single join on integer codes.
+        groups = {}
+        for filter_number, filters in enumerate(filter_list):
+            groups.setdefault(tuple(filters.keys()), []).append((filter_number, filters))
+
+        matches = []
+        row_count = len(self.results)
+        for keys, group in groups.items():
+            filter_numbers = np.array([filter_number for filter_number, _ in group])
+            if not keys:
+                rows = np.tile(np.arange(row_count), len(filter_numbers))
+                matches.append(pd.DataFrame({"filter": np.repeat(filter_numbers, row_count), "row": rows}))
+                continue
+            key_codes = [(self._column_codes(key)[0], self._value_codes(key, [filters[key] for _, filters in group])) for key in keys]
+            valid_filters = np.logical_and.reduce([value_codes >= 0 for _, value_codes in key_codes])
+            radices = [len(self._column_codes(key)[1]) + 1 for key in keys]
+            if math.prod(radices) <= np.iinfo(np.int64).max:
+                matches.append(self._packed_matches(key_codes, radices, filter_numbers, valid_filters))
+            else:
+                matches.append(self._joined_matches(key_codes, filter_numbers, valid_filters))
+
+        if not matches:
+            return np.array([], dtype=int)
+        matched = pd.concat(matches, ignore_index=True).sort_values(["filter", "row"], kind="stable")
+        return matched["row"].to_numpy()
+
+    def _packed_matches(self, key_codes, radices, filter_numbers, valid_filters):
+        """
+        Helper function to match rows and filters on the codes of every key combined into a single integer per row
+        and per filter, so the rows of all filters are found with one vectorized isin followed by a join over the
+        matches only. Only valid while the product of radices fits in an int64, since the combined keys would
+        otherwise wrap around and different values could share a key.
+        """
+        row_keys = np.zeros(len(self.results), dtype=np.int64)
+        filter_keys = np.zeros(len(filter_numbers), dtype=np.int64)
+        for (codes, value_codes), radix in zip(key_codes, radices):
+            row_keys = row_keys * radix + codes + 1
+            filter_keys = filter_keys * radix + value_codes + 1
+        filter_keys = filter_keys[valid_filters]
+        matched_rows = np.flatnonzero(np.isin(row_keys, filter_keys))
+        filter_frame = pd.DataFrame({"key": filter_keys, "filter": filter_numbers[valid_filters]})
+        row_frame = pd.DataFrame({"key": row_keys[matched_rows], "row": matched_rows})
+        return filter_frame.merge(row_frame, on="key")[["filter", "row"]]
+
+    def _joined_matches(self, key_codes, filter_numbers, valid_filters):
+        """
+        Helper function to match rows and filters with a join on the codes of each key, for keys with too many
+        combinations of values to combine into a single integer. Rows are first narrowed to those whose codes
+        appear in some filter for every key.
+        """
+        candidate_rows = np.ones(len(self.results), dtype=bool)
+        for codes, value_codes in key_codes:
+            candidate_rows &= np.isin(codes, value_codes[valid_filters])
+        matched_rows = np.flatnonzero(candidate_rows)
+        filter_frame = pd.DataFrame({f"key{i}": value_codes[valid_filters] for i, (_, value_codes) in enumerate(key_codes)})
+        filter_frame["filter"] = filter_numbers[valid_filters]
+        row_frame = pd.DataFrame({f"key{i}": codes[matched_rows] for i, (codes, _) in enumerate(key_codes)})
+        row_frame["row"] = matched_rows
+        return filter_frame.merge(row_frame, on=[f"key{i}" for i in range(len(key_codes))])[["filter", "row"]]
+
+    def query(self, filter_list, mons = None, require_all = False):
+        """
+        Function to collect the rows matched by each filter in a filter list, equivalent to concatenating
+        filtered_results() for every filter, optionally restricted to teams with the given Pokemon in any slot.
+        Arguments:
+        - filter_list:
+            list of dictionaries with filters in {filter: value} format.
+        - mons:
+            (Optional) a str or list of strs of cleaned Pokemon names to restrict the teams to.
+        - require_all:
+            bool for whether every Pokemon in mons must be on the team. Default is False.
+        Returns:
+            pd.DataFrame of the matching rows of results
+        """
+        positions = self.positions(filter_list)
+        if mons:
+            positions = positions[np.isin(positions, self.mon_positions(mons, require_all))]
+        return self.results.iloc[positions]
+
+    def _build_mon_index(self):
+        """
+        Helper function to build the inverted index from each Pokemon to the rows that brought it in any slot.
+        """
+        slots = np.concatenate([np.asarray(self.results[mon], dtype=object) for mon in mon_categories])
+        codes, uniques = pd.factorize(slots)
+        rows = np.tile(np.arange(len(self.results)), len(mon_categories))
+        order = np.argsort(codes, kind="stable")
+        boundaries = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self._mon_index = (pd.Index(uniques), rows[order], boundaries)
+
+    def mon_positions(self, mons, require_all = False):
+        """
+        Function to find the rows whose team contains the given Pokemon in any of the six slots.
+        Arguments:
+        - mons:
+            a str or list of strs of cleaned Pokemon names, as produced by pokemon_name_clean().
+        - require_all:
+            bool for whether every Pokemon must be on the team. Default is False, which matches teams with any of them.
+        Returns:
+            np.ndarray of sorted row positions
+        """
+        if self._mon_index is None:
+            self._build_mon_index()
+        uniques, rows, boundaries = self._mon_index
+        if not isinstance(mons, list):
+            mons = [mons]
+        row_sets = []
+        for code in uniques.get_indexer(pd.Index(mons, dtype=object)):
+            row_sets.append(np.unique(rows[boundaries[code]:boundaries[code + 1]]) if code >= 0 else np.array([], dtype=int))
+        if not row_sets:
+            return np.array([], dtype=int)
+        combine = np.intersect1d if require_all else np.union1d
+        positions = row_sets[0]
+        for row_set in row_sets[1:]:
+            positions = combine(positions, row_set)
+        return positions
+
+    def with_mons(self, mons, require_all = False):
+        """
+        Function to collect the rows whose team contains the given Pokemon in any slot. Takes the same
+        arguments as mon_positions().
+        Returns:
+            pd.DataFrame of the matching rows of results
+        """
+        return self.results.iloc[self.mon_positions(mons, require_all)]
@@ -0,0 +1,146 @@
+# Request scheduling: per-host rate limits and retry backoff
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+class FetchError(Exception):
+    """
+    Raised when a page could not be fetched after retrying for the allowed time.
+    """
+
+class ThrottledError(FetchError):
+    """
+    Raised when a host answers with a status that asks for the request to be retried later, e.g. 429 or 503.
+    Arguments:
+    - url:
+        str of the URL that was requested.
+    - status_code:
+        int of the HTTP status of the response.
+    - retry_after:
+        (Optional) float of the seconds the host asked to wait, from its Retry-After header.
+    """
+    def __init__(self, url, status_code, retry_after = None):
+        super().__init__(f"{url} answered with status {status_code}")
+        self.url = url
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class IncompleteScrapeError(Exception):
+    """
+    Raised at the end of a scrape when some pages still could not be fetched after being retried at the end.
+    Arguments:
+    - skipped:
+        list of strs describing the tier/regions and members that were skipped.
+    - results:
+        pd.DataFrame of the results of everything that was scraped.
+    """
+    def __init__(self, skipped, results):
+        super().__init__(f"Skipped {len(skipped)} tier/regions or members after retrying: {', '.join(skipped[:10])}"
+                         + (", ..." if len(skipped) > 10 else ""))
+        self.skipped = skipped
+        self.results = results
+
+class TokenBucket:
+    """
+    Token bucket that allows bursts of up to burst requests and a sustained rate of rate requests per second.
+    Can be paused, e.g. while a host has asked for requests to stop with a Retry-After header.
+    Arguments:
+    - rate:
+        float of the sustained number of requests per second.
+    - burst:
+        int of the maximum number of requests that can be made at once after a quiet period.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Function to block until a request can be made, then take a token for it.
+        Returns:
+            float of the time in seconds spent waiting
+        """
+        waited = 0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds):
+        """
+        Function to stop handing out tokens for the given number of seconds.
+        """
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+class HostRateLimiter:
+    """
+    Keeps a separate TokenBucket for each host, so that a slow or throttling host does not hold up requests to others.
+    Arguments:
+    - rate:
+        float of the sustained number of requests per second allowed to each host.
+    - burst:
+        int of the maximum number of requests that can be made at once to each host.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host):
+        with self._lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+            return self.buckets[host]
+
+    def acquire(self, host):
+        return self.bucket(host).acquire()
+
+    def pause(self, host, seconds):
+        self.bucket(host).pause(seconds)
+
+def backoff_delay(attempt, interval = 1, max_delay = 60):
+    """
+    Function to get the time to wait before retrying, growing exponentially with each attempt. The delay is drawn
+    uniformly between zero and the exponential bound ("full jitter") so that workers retrying at once spread out.
+    Arguments:
+    - attempt:
+        int of the number of attempts that have failed so far, starting at 0.
+    - interval:
+        float of the bound in seconds for the first retry. Default is 1 second.
+    - max_delay:
+        float of the largest bound in seconds. Default is 60 seconds.
+    """
+    return random.uniform(0, min(max_delay, interval * 2 ** attempt))
+
+def retry_after_seconds(response):
+    """
+    Function to read the Retry-After header of a response, given either in seconds or as an HTTP date.
+    Returns:
+        float of the number of seconds to wait, or None if the header is missing or invalid
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
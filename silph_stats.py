@@ -0,0 +1,211 @@
+# Usage, co-occurrence and win-record statistics over scraped results
+import pickle
+import numpy as np
+import pandas as pd
+
+from silph_query import mon_categories
+
+# Finest grouping kept by default. Statistics for any subset of these columns are rolled up from it. Faction and
+# player are left out since each faction only brings a handful of teams per bout, which would make the tables
+# nearly as large as the results themselves.
+stats_group_by = ["season", "cycle", "bout", "format", "tier", "region"]
+
+def _records(results):
+    """
+    Helper function to split the "W-L" record column into integer arrays of wins and losses.
+    """
+    record = results["record"].astype(str).str.split("-", n=1, expand=True).reindex(columns=[0, 1])
+    wins = pd.to_numeric(record[0], errors="coerce").fillna(0).astype(np.int64).to_numpy()
+    losses = pd.to_numeric(record[1], errors="coerce").fillna(0).astype(np.int64).to_numpy()
+    return wins, losses
+
+def _unique_sums(keys, *weights):
+    """
+    Helper function to count the occurrences of each unique integer key and sum the weights of each.
+    Returns:
+        (unique keys, counts, [sums of each weight])
+    """
+    inverse, unique_keys = pd.factorize(keys)
+    counts = np.bincount(inverse, minlength=len(unique_keys))
+    return unique_keys, counts, [np.bincount(inverse, weights=weight, minlength=len(unique_keys)).astype(np.int64) for weight in weights]
+
+def _group_index(groups, group_codes, *levels):
+    """
+    Helper function to build a MultiIndex from the group of each entry plus extra levels, given as (name, values).
+    """
+    arrays = [groups.get_level_values(level)[group_codes] for level in range(groups.nlevels)] + [values for _, values in levels]
+    return pd.MultiIndex.from_arrays(arrays, names=list(groups.names) + [name for name, _ in levels])
+
+def _tables(results, group_by):
+    """
+    Helper function to compute the team, Pokemon and pair tables of results at the grain of group_by. All the
+    work is done on integer codes: the group_by columns are factorized into a single group code, and the six
+    Pokemon columns share one sorted set of codes so pairs can be ordered alphabetically by comparing codes.
+    Empty slots ("N/A") and repeats of a Pokemon on a team are not counted.
+    """
+    team_count = len(results)
+    wins, losses = _records(results)
+    group_codes, groups = pd.MultiIndex.from_frame(results[group_by]).factorize()
+    groups = groups.set_names(group_by)
+    group_count = len(groups)
+    teams = pd.DataFrame({"teams": np.bincount(group_codes, minlength=group_count),
+                          "wins": np.bincount(group_codes, weights=wins, minlength=group_count).astype(np.int64),
+                          "losses": np.bincount(group_codes, weights=losses, minlength=group_count).astype(np.int64)}, index=groups)
+
+    slots = np.concatenate([np.asarray(results[mon], dtype=object) for mon in mon_categories])
+    mon_codes, mon_names = pd.factorize(slots, sort=True)
+    mon_names = np.asarray(mon_names, dtype=object)
+    mon_count = max(len(mon_names), 1)
+    mon_codes = mon_codes.reshape(len(mon_categories), team_count)
+    valid = (mon_codes >= 0) & (mon_names[np.maximum(mon_codes, 0)] != "N/A") if len(mon_names) else mon_codes >= 0
+
+    team_numbers = np.broadcast_to(np.arange(team_count), mon_codes.shape)
+    team_mons = pd.unique(team_numbers[valid] * mon_count + mon_codes[valid])
+    team_of, mon_of = team_mons // mon_count, team_mons % mon_count
+    keys, counts, (mon_wins, mon_losses) = _unique_sums(group_codes[team_of] * mon_count + mon_of, wins[team_of], losses[team_of])
+    mons = pd.DataFrame({"teams": counts, "wins": mon_wins, "losses": mon_losses},
+                        index=_group_index(groups, keys // mon_count, ("mon", mon_names[keys % mon_count])))
+
+    team_pairs = []
+    for i in range(len(mon_categories)):
+        for j in range(i + 1, len(mon_categories)):
+            low, high = np.minimum(mon_codes[i], mon_codes[j]), np.maximum(mon_codes[i], mon_codes[j])
+            pair_valid = valid[i] & valid[j] & (low != high)
+            team_pairs.append((np.arange(team_count)[pair_valid] * mon_count + low[pair_valid]) * mon_count + high[pair_valid])
+    team_pairs = pd.unique(np.concatenate(team_pairs))
+    team_of, pair_of = team_pairs // (mon_count * mon_count), team_pairs % (mon_count * mon_count)
+    keys, counts, _ = _unique_sums(group_codes[team_of] * mon_count * mon_count + pair_of)
+    pair_of = keys % (mon_count * mon_count)
+    pairs = pd.DataFrame({"teams": counts},
+                         index=_group_index(groups, keys // (mon_count * mon_count),
+                                            ("mon_a", mon_names[pair_of // mon_count]), ("mon_b", mon_names[pair_of % mon_count])))
+    return teams, mons, pairs
+
+def _group_sum(frame, by, columns):
+    """
+    Helper function to sum columns over the groups of by. An empty by sums over the whole frame.
+    """
+    if by:
+        return frame.groupby(by, observed=True, sort=True, dropna=False)[columns].sum()
+    return frame[columns].sum().to_frame().T
+
+class UsageStatistics:
+    """
+    Aggregated Pokemon usage counts, co-occurring pairs and win records, kept at the grain of group_by so
+    that statistics for any subset of those columns can be rolled up without rescanning results. New bouts
+    are folded in with update(), so weekly statistics only cost a pass over the new rows.
+
+        stats = UsageStatistics.from_results(results)
+        stats.update(new_results)
+        stats.usage(by=["season", "cycle", "bout", "format"])
+
+    Arguments:
+    - group_by:
+        list of strs of results columns to keep statistics for. Default is stats_group_by. Add "player"
+        for per-player statistics.
+    """
+    def __init__(self, group_by = stats_group_by):
+        self.group_by = list(group_by)
+        self.teams = None
+        self.mons = None
+        self.pairs = None
+
+    @classmethod
+    def from_results(cls, results, group_by = stats_group_by):
+        """
+        Function to compute statistics over a results DataFrame obtained by running full_scrape().
+        """
+        return cls(group_by).update(results)
+
+    def update(self, new_results):
+        """
+        Function to add the statistics of new results. The rows of new_results must not already have been
+        counted, e.g. only the rows scraped for the latest bout.
+        Returns:
+            the updated UsageStatistics
+        """
+        new_tables = _tables(new_results, self.group_by)
+        if self.teams is None:
+            self.teams, self.mons, self.pairs = new_tables
+        else:
+            self.teams, self.mons, self.pairs = [table.add(new_table, fill_value=0).astype(np.int64)
+                                                 for table, new_table in zip((self.teams, self.mons, self.pairs), new_tables)]
+        return self
+
+    def _rollup(self, table, by, keys = ()):
+        """
+        Helper function to roll a table up from group_by to the columns of by.
+        """
+        by = self.group_by if by is None else list(by)
+        if set(by) - set(self.group_by):
+            raise Exception(f"Statistics are only kept for {self.group_by}. Please remove {set(by) - set(self.group_by)} or recompute with a finer group_by.")
+        return _group_sum(table.reset_index(), by + list(keys), list(table.columns))
+
+    def win_records(self, by = None):
+        """
+        Function to get the team count, wins, losses and win rate of every group.
+        Arguments:
+        - by:
+            (Optional) list of strs of columns to group by, a subset of group_by. Defaults to group_by.
+        Returns:
+            pd.DataFrame indexed by the groups with columns [teams, wins, losses, win_rate]
+        """
+        records = self._rollup(self.teams, by)
+        records["win_rate"] = records["wins"] / (records["wins"] + records["losses"]).replace(0, np.nan)
+        return records
+
+    def usage(self, by = None):
+        """
+        Function to get how often each Pokemon is brought within every group.
+        Arguments:
+        - by:
+            (Optional) list of strs of columns to group by, a subset of group_by. Defaults to group_by.
+        Returns:
+            pd.DataFrame indexed by the groups and Pokemon with columns [count, rate, wins, losses, win_rate],
+            where count is the number of teams that brought the Pokemon and rate is count over the teams in
+            the group. Sorted by descending count within each group.
+        """
+        by = self.group_by if by is None else list(by)
+        usage = self._rollup(self.mons, by, ["mon"]).rename(columns={"teams": "count"})
+        if by:
+            group_teams = self._rollup(self.teams, by)["teams"].reindex(usage.index.droplevel("mon")).to_numpy()
+        else:
+            group_teams = int(self.teams["teams"].sum())
+        usage["rate"] = usage["count"] / group_teams
+        usage["win_rate"] = usage["wins"] / (usage["wins"] + usage["losses"]).replace(0, np.nan)
+        usage = usage[["count", "rate", "wins", "losses", "win_rate"]].reset_index()
+        usage = usage.sort_values(by + ["count"], ascending=[True] * len(by) + [False], kind="stable")
+        return usage.set_index(by + ["mon"])
+
+    def cooccurrence(self, by = None, mon = None):
+        """
+        Function to get how often each pair of Pokemon is brought on the same team within every group.
+        Arguments:
+        - by:
+            (Optional) list of strs of columns to group by, a subset of group_by. Defaults to group_by.
+        - mon:
+            (Optional) str of a Pokemon to restrict the pairs to, e.g. its most common partners.
+        Returns:
+            pd.DataFrame indexed by the groups and pairs with column [count], sorted by descending count within each group
+        """
+        by = self.group_by if by is None else list(by)
+        pairs = self._rollup(self.pairs, by, ["mon_a", "mon_b"]).rename(columns={"teams": "count"}).reset_index()
+        if mon is not None:
+            pairs = pairs[(pairs["mon_a"] == mon) | (pairs["mon_b"] == mon)]
+        pairs = pairs.sort_values(by + ["count"], ascending=[True] * len(by) + [False], kind="stable")
+        return pairs.set_index(by + ["mon_a", "mon_b"])
+
+    def save(self, path):
+        """
+        Function to pickle the statistics so they can be updated by a later run.
+        """
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(path):
+        """
+        Function to load statistics saved with save().
+        """
+        with open(path, "rb") as f:
+            return pickle.load(f)
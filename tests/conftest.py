@@ -0,0 +1,31 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def mock_silph(tmp_path, monkeypatch):
+    """
+    MockSilphServer serving a synthetic corpus, with the scraper pointed at it and its caches in tmp_path.
+    The url_base of the corpus is available as server.url_base.
+    """
+    import silph_factions_scraper as sf
+    from silph_benchmark import write_synthetic_fixtures
+    from silph_mock_server import MockSilphServer
+
+    fixture_dir = str(tmp_path / "fixtures")
+    url_base = write_synthetic_fixtures(fixture_dir)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sf.cache_store, "path", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(sf.cache_store, "_local", threading.local())
+    monkeypatch.setattr(sf.cache_store, "_size", None)
+    monkeypatch.setattr(sf, "host_rate_limiter", sf.HostRateLimiter(1e9, 1e9))
+    with MockSilphServer(fixture_dir) as server:
+        monkeypatch.setattr(sf, "silph_url_base", server.url)
+        monkeypatch.setattr(sf, "card_url_base", server.url + "/")
+        server.url_base = server.url + url_base
+        yield server
@@ -0,0 +1,46 @@
+import silph_cache
+from silph_cache import CacheStore
+
+
+def test_evicts_least_recently_used_past_max_bytes(tmp_path):
+    store = CacheStore(str(tmp_path / "cache.sqlite"), max_bytes=5000)
+    for i in range(5):
+        store.set("card", f"player{i}", b"x" * 900)
+    store.get("card", "player0")
+    store.set("card", "player5", b"x" * 900)
+    assert store.stats()["bytes"] <= 5000
+    assert store.get("card", "player0")[0]
+    assert not store.get("card", "player1")[0]
+    assert store.get("card", "player5")[0]
+
+
+def test_running_size_matches_table(tmp_path, monkeypatch):
+    monkeypatch.setattr(silph_cache, "size_recount_interval", 10**9)
+    store = CacheStore(str(tmp_path / "cache.sqlite"), max_bytes=10**6)
+    for i in range(20):
+        store.set("card", f"player{i % 7}", b"x" * (100 + i))
+    store.delete("card", "player3")
+    store.set("roster", "Gold_NA", [1, 2, 3])
+    assert store._size == store.stats()["bytes"]
+
+
+def test_replacing_entry_is_not_counted_twice(tmp_path):
+    store = CacheStore(str(tmp_path / "cache.sqlite"), max_bytes=2000)
+    for _ in range(10):
+        store.set("card", "player0", b"x" * 900)
+    store.set("card", "player1", b"x" * 900)
+    assert store.get("card", "player0")[0]
+    assert store.get("card", "player1")[0]
+    assert store.evicted == 0
+
+
+def test_card_cache_key_positional_url_base(tmp_path, monkeypatch):
+    import threading
+    import silph_factions_scraper as sf
+    monkeypatch.setattr(sf.cache_store, "path", str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(sf.cache_store, "_local", threading.local())
+    monkeypatch.setattr(sf, "fetch_card", lambda username: b"<html></html>")
+    old_cycle = "https://silph.gg/factions/cycle/season-2-cycle-3-"
+    sf.user_bout_rows("player", old_cycle)
+    assert sf.cache_store.get("card", sf._card_cache_key("player", old_cycle))[0]
+    assert not sf.cache_store.get("card", sf._card_cache_key("player"))[0]
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+import silph_journal
+from silph_journal import ScrapeJournal
+
+run = {"url_base": "https://silph.gg/factions/cycle/season-2-cycle-4-", "tiers": ["Gold"], "regions": ["NA"]}
+
+
+def test_resumes_unfinished_journal(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ScrapeJournal(path, run)
+    journal.record_roster("Gold", "NA", {"Faction": ["player0", "player1"]})
+    journal.record_player("player0", [["NA", "Gold"]])
+    resumed = ScrapeJournal(path, run)
+    assert resumed.rosters == {("Gold", "NA"): {"Faction": ["player0", "player1"]}}
+    assert resumed.players == {"player0": [["NA", "Gold"]]}
+
+
+def test_does_not_resume_other_runs_or_finished_journals(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ScrapeJournal(path, run)
+    journal.record_player("player0", [])
+    assert ScrapeJournal(path, dict(run, tiers=["Silver"])).players == {}
+    journal = ScrapeJournal(path, run)
+    journal.record_player("player0", [])
+    journal.complete()
+    assert ScrapeJournal(path, run).players == {}
+    journal = ScrapeJournal(path, run)
+    journal.record_player("player0", [])
+    assert ScrapeJournal(path, run, resume=False).players == {}
+
+
+def test_drops_partial_last_line(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ScrapeJournal(path, run)
+    journal.record_player("player0", [])
+    with open(path, "a") as f:
+        f.write('{"type": "player", "player": "pla')
+    resumed = ScrapeJournal(path, run)
+    assert resumed.players == {"player0": []}
+    with open(path) as f:
+        assert [json.loads(line)["type"] for line in f] == ["run", "player"]
+    assert os.listdir(tmp_path) == ["journal.jsonl"]
+
+
+def test_crash_during_rewrite_keeps_journal(tmp_path, monkeypatch):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ScrapeJournal(path, run)
+    journal.record_player("player0", [])
+    with open(path, "a") as f:
+        f.write('{"type": "pla')
+
+    def crash(*args):
+        raise OSError("crash")
+    monkeypatch.setattr(silph_journal.os, "replace", crash)
+    with pytest.raises(OSError):
+        ScrapeJournal(path, run)
+    monkeypatch.undo()
+    assert ScrapeJournal(path, run).players == {"player0": []}
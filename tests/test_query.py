@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import silph_factions_scraper as sf
+from silph_benchmark import synthetic_results
+from silph_query import ResultsIndex
+
+mon_categories = ["mon1", "mon2", "mon3", "mon4", "mon5", "mon6"]
+
+
+def concatenated_filtered_results(results, filter_list):
+    return pd.concat([sf.filtered_results(results, **filters) for filters in filter_list])
+
+
+def overflow_results():
+    # 2048 distinct players and mons give a radix product of 2049 ** 7 > 2 ** 63 over player and mon1-mon6.
+    results = pd.DataFrame({category: ["x"] * 2048 for category in sf.results_categories})
+    results["player"] = [f"p{i}" for i in range(2048)]
+    for mon in mon_categories:
+        results[mon] = [f"m{i}" for i in range(2048)]
+    results.loc[2047, ["player"] + mon_categories] = ["p512"] + ["m0"] * 6
+    return results
+
+
+def test_subset_results_does_not_overflow_combined_keys():
+    results = overflow_results()
+    filter_list = [{"player": "p0", **{mon: "m0" for mon in mon_categories}}]
+    subset = sf.subset_results(results, filter_list)
+    assert list(subset.index) == [0]
+    pd.testing.assert_frame_equal(subset, concatenated_filtered_results(results, filter_list))
+
+
+@pytest.mark.parametrize("keys", [["season", "cycle", "bout"], ["tier", "faction", "format"],
+                                  ["player"] + mon_categories, ["faction", "player", "format"] + mon_categories])
+def test_subset_results_matches_filtered_results(keys):
+    generator = np.random.default_rng(0)
+    results = synthetic_results(5000, seed=0)
+    rows = generator.choice(len(results), 40)
+    filter_list = [{key: results.iloc[row][key] for key in keys} for row in rows]
+    filter_list += [{key: "missing" for key in keys}, filter_list[0]]
+    index = ResultsIndex(results)
+    subset = sf.subset_results(index, filter_list)
+    pd.testing.assert_frame_equal(subset, concatenated_filtered_results(results, filter_list))
+
+
+def test_subset_results_mixed_key_sets():
+    results = overflow_results()
+    filter_list = [{"player": "p512"}, {"player": "p0", **{mon: "m0" for mon in mon_categories}}, {}, {"mon1": "m0"}]
+    pd.testing.assert_frame_equal(sf.subset_results(results, filter_list), concatenated_filtered_results(results, filter_list))
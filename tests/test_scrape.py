@@ -0,0 +1,60 @@
+import pytest
+
+import silph_factions_scraper as sf
+
+tiers, regions = ["Gold", "Silver"], ["NA", "EMEA"]
+
+
+def test_concurrent_scrape_matches_sequential(mock_silph):
+    sequential = sf.full_scrape(tiers, regions, mock_silph.url_base, max_workers=1)
+    sf.cache_store.clear()
+    concurrent = sf.full_scrape(tiers, regions, mock_silph.url_base, max_workers=8)
+    assert len(sequential) == 640
+    assert sequential.equals(concurrent)
+
+
+def test_failed_faction_pages_are_retried_alone(mock_silph):
+    expected = sf.full_scrape(tiers, regions, mock_silph.url_base, max_workers=8)
+    sf.cache_store.clear()
+    mock_silph.error_rate = 0.3
+    mock_silph._random.seed(0)
+    mock_silph.requests_served = mock_silph.errors_served = 0
+    results = sf.full_scrape(tiers, regions, mock_silph.url_base, max_workers=8, connection_timeout=30, interval=0.01)
+    assert mock_silph.errors_served > 0
+    # 4 tier and region pages, 16 faction pages and 80 cards, each served successfully exactly once.
+    assert mock_silph.requests_served - mock_silph.errors_served == 100
+    assert results.equals(expected)
+
+
+def test_incremental_scrape_finds_new_bout(mock_silph):
+    full = sf.full_scrape(tiers, regions, mock_silph.url_base, max_workers=8)
+    previous = full[full["bout"] < 8].reset_index(drop=True)
+    key = sf.bout_key_categories
+
+    mock_silph.requests_served = 0
+    updated = sf.incremental_scrape(previous, tiers=tiers, regions=regions, url_base=mock_silph.url_base, max_workers=8)
+    assert mock_silph.requests_served == 80
+    assert updated.sort_values(key).reset_index(drop=True).equals(full.sort_values(key).reset_index(drop=True))
+
+    mock_silph.requests_served = 0
+    sf.incremental_scrape(full, tiers=tiers, regions=regions, url_base=mock_silph.url_base, max_workers=8)
+    assert mock_silph.requests_served == sf.current_bout_probes
+
+
+def test_skipped_pages_fail_the_scrape_and_resume(mock_silph):
+    expected = sf.full_scrape(tiers, regions, mock_silph.url_base, max_workers=8)
+    sf.cache_store.clear()
+    mock_silph.error_rate = 0.8
+    mock_silph.retry_after = 0.05
+    mock_silph._random.seed(1)
+    with pytest.raises(sf.IncompleteScrapeError) as error:
+        sf.full_scrape(tiers, regions, mock_silph.url_base, max_workers=8, connection_timeout=0.3, interval=0.01)
+    assert error.value.skipped
+    assert len(error.value.results) < len(expected)
+    with open(sf.scrape_journal) as journal:
+        assert '"complete"' not in journal.read()
+
+    mock_silph.error_rate = 0
+    results = sf.full_scrape(tiers, regions, mock_silph.url_base, max_workers=8)
+    assert results.sort_values(sf.bout_key_categories).reset_index(drop=True).equals(
+        expected.sort_values(sf.bout_key_categories).reset_index(drop=True))
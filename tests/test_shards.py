@@ -0,0 +1,76 @@
+import pytest
+
+import silph_factions_scraper as sf
+
+tiers, regions = ["Gold", "Silver"], ["NA", "EMEA"]
+
+
+def sort_results(results):
+    return results.sort_values(sf.bout_key_categories).reset_index(drop=True)
+
+
+@pytest.fixture
+def shards(mock_silph):
+    return [sf.full_scrape(tiers, regions, mock_silph.url_base, max_workers=8, shard=(i, 3)) for i in range(3)]
+
+
+def test_shard_of_is_stable_and_in_range():
+    players = [f"Player{i}" for i in range(200)]
+    assignments = [sf.shard_of(player, 4) for player in players]
+    assert assignments == [sf.shard_of(player, 4) for player in players]
+    assert set(assignments) == {0, 1, 2, 3}
+    assert all(sf.shard_of(player, 1) == 0 for player in players)
+
+
+def test_parse_shard():
+    assert sf.parse_shard("0/4") == (0, 4)
+    assert sf.parse_shard(" 3/4 ") == (3, 4)
+    for shard in ["4/4", "5/4", "1", "a/4", "-1/4", "1/4/2", ""]:
+        with pytest.raises(Exception, match="Unable to parse shard"):
+            sf.parse_shard(shard)
+
+
+def test_merged_shards_match_unsharded_scrape(mock_silph, shards):
+    assert all(results.attrs["shard_count"] == 3 for results in shards)
+    assert sum(len(results) for results in shards) == 640
+    unsharded = sf.full_scrape(tiers, regions, mock_silph.url_base, max_workers=8)
+    merged = sf.merge_shards(shards[::-1])
+    assert merged.attrs == {}
+    assert sort_results(merged).equals(sort_results(unsharded))
+
+
+def test_merge_shards_accepts_pickles(shards, tmp_path):
+    paths = []
+    for results in shards:
+        paths.append(str(tmp_path / f"shard-{results.attrs['shard']}.pkl"))
+        results.to_pickle(paths[-1])
+    assert sf.merge_shards(paths).equals(sf.merge_shards(shards))
+
+
+def test_merge_shards_rejects_missing_and_repeated_shards(shards):
+    with pytest.raises(Exception, match="No shards"):
+        sf.merge_shards([])
+    with pytest.raises(Exception, match=r"Missing shards: \[1\]\. Repeated shards: \[\]"):
+        sf.merge_shards([shards[0], shards[2]])
+    with pytest.raises(Exception, match=r"Missing shards: \[\]\. Repeated shards: \[0\]"):
+        sf.merge_shards(shards + [shards[0]])
+
+
+def test_merge_shards_rejects_mismatched_schema(shards):
+    unsharded = shards[0].copy()
+    unsharded.attrs = {}
+    with pytest.raises(Exception, match="missing their shard"):
+        sf.merge_shards([unsharded] + shards[1:])
+
+    extra_column = shards[1].assign(extra=1)
+    with pytest.raises(Exception, match="instead of"):
+        sf.merge_shards([shards[0], extra_column, shards[2]])
+
+    other_scrape = shards[2].copy()
+    other_scrape.attrs = dict(shards[2].attrs, url_base="https://silph.gg/factions/cycle/season-1-cycle-1-")
+    with pytest.raises(Exception, match="different scrapes"):
+        sf.merge_shards(shards[:2] + [other_scrape])
+
+    other_dtypes = shards[1].astype({"season": "float64"})
+    with pytest.raises(Exception, match="different column dtypes"):
+        sf.merge_shards([shards[0], other_dtypes, shards[2]])
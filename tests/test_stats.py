@@ -0,0 +1,31 @@
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from silph_benchmark import synthetic_results
+from silph_query import mon_categories
+from silph_stats import UsageStatistics
+
+
+@pytest.fixture(scope="module")
+def results():
+    return synthetic_results(5000, seed=0)
+
+
+@pytest.mark.parametrize("by", [None, ["format"], []])
+def test_update_matches_from_results(results, by):
+    first, second = results.iloc[:3000], results.iloc[3000:]
+    updated = UsageStatistics.from_results(first).update(second)
+    full = UsageStatistics.from_results(results)
+    for table in ("usage", "cooccurrence", "win_records"):
+        pd.testing.assert_frame_equal(getattr(updated, table)(by).sort_index(), getattr(full, table)(by).sort_index())
+
+
+def test_usage_matches_brute_force_count(results):
+    counts = Counter()
+    for _, team in results.iterrows():
+        for mon in {team[mon] for mon in mon_categories} - {"N/A"}:
+            counts[(team["format"], mon)] += 1
+    usage = UsageStatistics.from_results(results).usage(["format"])
+    assert usage["count"].to_dict() == counts